@@ -1,20 +1,83 @@
+import time
+
+# 记录本模块及其依赖（FastAPI、各服务模块）的导入耗时
+IMPORT_STARTED = time.perf_counter()
+
 import os
-import datetime
-import tempfile
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
+import math
+import uuid
+import logging
+import hashlib
+import zipfile
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import asyncio
-import concurrent.futures
-import json
 
 # 导入其他模块
-from app.service.extractors import extract_pdf_text
-from app.service.processors import process_task, process_json_task, process_reasoning_task, process_content_task
+from app.service import metrics
+from app.service.admission import AdmissionRejected, admission_controller, rate_limiter, run_admitted
+from app.service.extractors import shutdown_process_pool
+from app.service.pipeline import review_pipeline
+from app.service.jobs import job_manager
+from app.service.batch import batch_manager
+from app.service.storage import new_part_path, upload_store, run_sweeper, write_part
+from app.service.upload_stream import UploadError, receive_pdf
+from app.service.processors import close_client
+from app.service.warmup import warmup
+from utils.conf import get_conf, get_workers
+from utils.log import get_logger, configure_logging, request_id_var
+
+# 获取配置
+conf = get_conf()
+log_conf = conf.get("log", {})
+configure_logging(
+    level=log_conf.get("level", "info"),
+    save_file=log_conf.get("save_file", False),
+    fmt=log_conf.get("format", "text"),
+)
+logger = get_logger("app.controller.api")
+
+# openai、PDF 解析库等较重的依赖在首次使用或启动预热时才导入
+import_seconds = time.perf_counter() - IMPORT_STARTED
+metrics.startup_seconds.set(import_seconds, phase="import")
+logger.info("模块导入耗时 %.2f 秒", import_seconds)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    应用生命周期
+
+    启动时将上次退出时未结束的评审任务标记为中断，启动上传文件的定期清理，并在后台预热
+    （完成前 /readyz 返回 503）；关闭时先报告未就绪，再中断进行中的评审任务，关闭模型客户端
+    连接和 PDF 解析进程池。
+    """
+    job_manager.recover()
+    await batch_manager.recover()
+    interval = conf.get("upload", {}).get("sweep_interval_minutes", 10) * 60
+    sweeper_task = asyncio.create_task(run_sweeper(upload_store, interval))
+    warmup.start()
+    try:
+        yield
+    finally:
+        await warmup.stop()
+        sweeper_task.cancel()
+        await batch_manager.shutdown()
+        await job_manager.shutdown()
+        logger.info("进行中的评审任务已中断")
+        logger.info("关闭模型客户端...")
+        await close_client()
+        logger.info("模型客户端已关闭")
+        shutdown_process_pool()
+        logger.info("PDF解析进程池已关闭")
+
 
 # 创建 FastAPI 应用
-app = FastAPI(title="论文评审 API", description="提供论文评审服务的 API 接口")
+app = FastAPI(title="论文评审 API", description="提供论文评审服务的 API 接口", lifespan=lifespan)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -25,302 +88,510 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有头
 )
 
-# 全局线程池执行器
-thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+
+# 流式响应的公共响应头
+SSE_HEADERS = {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'X-Accel-Buffering': 'no',  # 禁用Nginx缓冲，提高流式响应性能
+}
+
+
+class RequestIDMiddleware:
+    """
+    为每个请求分配请求 ID（优先使用客户端传入的 X-Request-ID），写入日志并在响应头中返回
+
+    使用纯 ASGI 中间件，不包装响应体，流式响应不受影响。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+app.add_middleware(RequestIDMiddleware)
 
 
 class ReviewRequest(BaseModel):
-    file_path: str
+    upload_id: Optional[str] = None
+    file_path: Optional[str] = None
     num_reviewers: int = 1
     page_limit: int = 0
     use_claude: bool = False
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
     """
     上传 PDF 文件接口
-    
+
+    请求体为 multipart/form-data，文件位于 file 字段。请求体边接收边写入临时文件，
+    大小上限在接收过程中生效，超限的文件不会被完整接收。
+
     Args:
-        file: PDF 文件
-    
+        request: 原始请求
+
     Returns:
         Dict: 包含上传文件信息的字典
     """
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="只接受 PDF 文件")
-    
+    upload_conf = conf.get("upload", {})
+    max_bytes = int(upload_conf.get("max_size_mb", 50) * 1024 * 1024)
+
+    part_path = None
+    started = time.monotonic()
     try:
-        # 创建临时文件
-        temp_dir = tempfile.gettempdir()
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        temp_path = os.path.join(temp_dir, f"temp_{timestamp}_{file.filename}")
-        
-        # 添加日志
-        print(f"[DEBUG] 临时目录: {temp_dir}")
-        print(f"[DEBUG] 创建临时文件: {temp_path}")
-        
-        # 保存上传的文件
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # 验证文件创建
-        if os.path.exists(temp_path):
-            print(f"[DEBUG] 临时文件创建成功: {temp_path}")
-            print(f"[DEBUG] 临时文件大小: {os.path.getsize(temp_path)} 字节")
-        else:
-            print(f"[ERROR] 临时文件创建失败: {temp_path}")
+        # 先写入临时文件，完成后按内容哈希保存到所有 worker 进程共享的存储中（原文件名只用于展示）
+        part_path = new_part_path()
+        logger.debug("接收上传文件，临时文件: %s", part_path)
+        try:
+            file_name, file_hash, total_bytes = await receive_pdf(request, part_path, max_bytes)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        file_name = os.path.basename(file_name or "upload.pdf")
+
+        # 内容哈希，相同内容只保存一份，同时用于命中提取文本缓存
+        upload_id, file_path, duplicate = await upload_store.put(part_path, file_hash, total_bytes, file_name)
+        logger.info("文件上传成功: %s，上传 ID: %s，大小: %s 字节，内容已存在: %s", file_name, upload_id, total_bytes, duplicate)
+        metrics.uploads_total.inc(status="success")
+        if duplicate:
+            metrics.upload_dedup_total.inc()
+        metrics.upload_seconds.observe(time.monotonic() - started)
+        metrics.upload_bytes.observe(total_bytes)
         
         return {
             "status": "success",
             "message": "文件上传成功",
-            "file_path": temp_path,
-            "file_name": file.filename
+            "upload_id": upload_id,
+            "file_path": file_path,
+            "file_name": file_name,
+            "file_hash": file_hash,
+            "deduplicated": duplicate
         }
+    except HTTPException as e:
+        metrics.uploads_total.inc(status=str(e.status_code))
+        raise
     except Exception as e:
-        print(f"[ERROR] 文件上传异常: {str(e)}")
-        import traceback
-        print(f"[ERROR] 异常堆栈: {traceback.format_exc()}")
+        metrics.uploads_total.inc(status="500")
+        logger.exception("文件上传异常: %s", e)
         raise HTTPException(status_code=500, detail=f"文件上传失败: {str(e)}")
+    finally:
+        # 上传未完成时清理残留的分块文件
+        if part_path and os.path.exists(part_path):
+            os.unlink(part_path)
+
+def client_key(request: Request):
+    """
+    限流使用的客户端标识：优先使用 X-API-Key，否则使用客户端 IP
+
+    只有配置 admission.trust_forwarded_for 时才采信 X-Forwarded-For（服务部署在可信反向代理之后）。
+    """
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    if conf.get("admission", {}).get("trust_forwarded_for", False):
+        forwarded = request.headers.get("x-forwarded-for", "").split(",")[0].strip()
+        if forwarded:
+            return "ip:" + forwarded
+    return "ip:" + (request.client.host if request.client else "unknown")
+
 
 @app.post("/review")
-async def review_paper_endpoint(request: ReviewRequest):
+async def review_paper_endpoint(request: ReviewRequest, http_request: Request):
     """
     执行论文评审接口（流式响应）
+
+    评审作为后台任务运行，与本次连接的生命周期无关；第一条事件为 job 事件，
+    包含任务 ID，连接断开后可通过 /review/{job_id}/events 续传。
+    同时进行的评审数达到上限时新任务排队并输出 queued 事件，排队已满或客户端请求过于频繁时返回 429。
                 
     Args:
         request: ReviewRequest 对象，包含文件路径和评审参数
+        http_request: 原始请求，用于识别客户端
     
     Returns:
         StreamingResponse: 流式响应评审结果
     """
-    from utils.get_prompt import get_markdown_prompt
-    import asyncio
-    import json
+    if not request.upload_id and not request.file_path:
+        raise HTTPException(status_code=400, detail="缺少 upload_id")
+
+    # 优先按上传 ID 定位共享存储中的文件，兼容直接传入 file_path 的旧用法；
+    # 同时为文件加引用，评审结束前不会被清理
+    try:
+        file_path, ref_id, file_hash = await upload_store.acquire(upload_id=request.upload_id or None, file_path=request.file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     # 检查文件路径
-    print(f"[DEBUG] 尝试访问文件: {request.file_path}")
-    if not os.path.exists(request.file_path):
-        print(f"[ERROR] 文件不存在: {request.file_path}")
+    logger.debug("尝试访问文件: %s", file_path)
+    if file_path is None or not os.path.exists(file_path):
+        await upload_store.release(ref_id)
+        logger.error("文件不存在: %s", file_path or request.upload_id)
         raise HTTPException(status_code=404, detail="文件不存在")
     else:
-        print(f"[DEBUG] 文件存在且可访问: {request.file_path}")
-        print(f"[DEBUG] 文件大小: {os.path.getsize(request.file_path)} 字节")
+        # 参数需要额外的文件系统调用，只在开启 DEBUG 时计算
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("文件存在且可访问: %s，大小: %s 字节", file_path, os.path.getsize(file_path))
 
-    async def stream_generator():
+    # 任务参数按内容哈希标识文件，不记录（也不会在任务状态中返回）服务器上的路径
+    params = {
+        "upload_id": request.upload_id or None,
+        "file_hash": file_hash,
+        "num_reviewers": request.num_reviewers,
+        "page_limit": request.page_limit,
+        "use_claude": request.use_claude,
+    }
+    # 相同参数的评审正在进行时直接复用该任务，不重复调用模型
+    job_id = await job_manager.find_active(params)
+    if job_id is None:
+        # 复用已有任务不占用名额，只对新任务限流和排队
+        client = client_key(http_request)
         try:
-            # 获取PDF文件名
-            pdf_name = os.path.basename(request.file_path)
-            print(f"[DEBUG] 开始处理PDF: {pdf_name}")
-            
+            rate_limiter.acquire(client)
             try:
-                # 第一阶段：提取PDF文本，直接流式返回进度
-                text_gen = extract_pdf_text(request.file_path, request.page_limit)
-                # 迭代所有消息
-                all_text = ""
-                async for message in text_gen:
-                    # 检查是否是文本内容消息
-                    if message.startswith('data:'):
-                        # 直接传递进度消息给前端
-                        yield message
-                    else:
-                        # 解析JSON获取文本内容或错误
-                        result = json.loads(message)
-                        if result["type"] == "extracted_text":
-                            all_text = result["text"]
-                        elif result["type"] == "error":
-                            # 如果是错误，转换为SSE格式并传递给前端
-                            error_msg = {
-                                "type": "error",
-                                "message": result["message"]
-                            }
-                            yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
-                            return
-                
-                if not all_text or not all_text.strip():
-                    raise Exception("PDF内容提取为空")
-                
-                print(f"[DEBUG] PDF文本提取完成，长度: {len(all_text)}")
-                
-                # 创建处理队列和任务
-                result_queue = asyncio.Queue()
-                prompt = get_markdown_prompt()
-
-                # 创建任务完成标志
-                tasks_complete = {"reasoning": False, "content": False, "json": False}
-                # 创建异步事件以通知队列处理完成
-                processing_complete = asyncio.Event()
-
-                # 定义用于从队列获取数据并流式返回的协程
-                async def stream_results():
-                    while not (tasks_complete["reasoning"] and tasks_complete["content"] and tasks_complete["json"]):
-                        try:
-                            # 尝试从队列获取数据，设置超时以避免阻塞
-                            try:
-                                item = await asyncio.wait_for(result_queue.get(), timeout=0.1)
-                                yield item
-                            except asyncio.TimeoutError:
-                                # 超时继续等待
-                                pass
-                        except Exception as e:
-                            print(f"[ERROR] 队列读取异常: {str(e)}")
-                    
-                    # 处理队列中剩余的数据
-                    while not result_queue.empty():
-                        try:
-                            item = result_queue.get_nowait()
-                            yield item
-                        except asyncio.QueueEmpty:
-                            break
-
-                # 定义在线程中执行的函数
-                def run_reasoning_task():
-                    # 执行推理任务并将结果放入队列
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        async def _process():
-                            try:
-                                # 调用处理函数并传递共享队列
-                                await process_reasoning_task(all_text, result_queue, prompt)
-                            except Exception as e:
-                                print(f"[ERROR] 推理任务异常: {str(e)}")
-                                error_msg = {
-                                    "type": "error",
-                                    "message": f"推理任务异常: {str(e)}"
-                                }
-                                await result_queue.put(f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n")
-                            finally:
-                                # 标记任务完成
-                                tasks_complete["reasoning"] = True
-                                
-                        return loop.run_until_complete(_process())
-                    finally:
-                        loop.close()
-                
-                def run_content_task():
-                    # 执行内容任务并将结果放入队列
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        async def _process():
-                            try:
-                                # 调用处理函数并传递共享队列
-                                await process_content_task(all_text, result_queue, prompt)
-                            except Exception as e:
-                                print(f"[ERROR] 内容任务异常: {str(e)}")
-                                error_msg = {
-                                    "type": "error",
-                                    "message": f"内容任务异常: {str(e)}"
-                                }
-                                await result_queue.put(f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n")
-                            finally:
-                                # 标记任务完成
-                                tasks_complete["content"] = True
-                                
-                        return loop.run_until_complete(_process())
-                    finally:
-                        loop.close()
-                
-                def run_json_task():
-                    # 执行JSON结构化任务并将结果放入队列
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        async def _process():
-                            try:
-                                # 调用处理函数并传递共享队列
-                                await process_json_task(all_text, result_queue)
-                            except Exception as e:
-                                print(f"[ERROR] JSON任务异常: {str(e)}")
-                                error_msg = {
-                                    "type": "error",
-                                    "message": f"JSON任务异常: {str(e)}"
-                                }
-                                await result_queue.put(f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n")
-                            finally:
-                                # 标记任务完成
-                                tasks_complete["json"] = True
-                                
-                        return loop.run_until_complete(_process())
-                    finally:
-                        loop.close()
-                
-                # 提交任务到线程池
-                reasoning_future = thread_pool.submit(run_reasoning_task)
-                content_future = thread_pool.submit(run_content_task)
-                json_future = thread_pool.submit(run_json_task)
-                
-                # 开始实时处理结果流
-                async for result in stream_results():
-                    yield result
-                
-                # 发送完成消息
-                complete_msg = {
-                    "type": "complete",
-                    "message": "评审完成"
-                }
-                yield f"data: {json.dumps(complete_msg, ensure_ascii=False)}\n\n"
-                
-            except Exception as e:
-                print(f"[ERROR] 处理异常: {str(e)}")
-                import traceback
-                print(f"[ERROR] 处理异常堆栈: {traceback.format_exc()}")
-                error_msg = {
-                    "type": "error",
-                    "message": str(e)
-                }
-                yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
-                
-        except Exception as e:
-            print(f"[ERROR] 流处理异常: {str(e)}")
-            import traceback
-            print(f"[ERROR] 流处理异常堆栈: {traceback.format_exc()}")
-            error_msg = {
-                "type": "error",
-                "message": str(e)
-            }
-            yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
-        finally:
-            # 清理临时文件
+                ticket = admission_controller.admit()
+            except AdmissionRejected:
+                # 排队已满时请求没有被处理，不计入该客户端的频率限制
+                rate_limiter.refund(client)
+                raise
+        except AdmissionRejected as e:
+            await upload_store.release(ref_id)
+            logger.warning("拒绝评审请求: %s", e)
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+        async def on_finish(status):
+            # 上传文件由存储按有效期和磁盘上限统一清理，这里只释放引用，相同文件再次评审无需重新上传
+            logger.debug("评审任务结束（%s），释放文件引用: %s", status, file_path)
             try:
-                if os.path.exists(request.file_path):
-                    print(f"[DEBUG] 清理临时文件: {request.file_path}")
-                    os.unlink(request.file_path)
-                    print(f"[DEBUG] 临时文件已清理")
-                else:
-                    print(f"[DEBUG] 临时文件不存在，无需清理: {request.file_path}")
-            except Exception as clean_err:
-                print(f"[ERROR] 临时文件清理失败: {str(clean_err)}")
-
-    return StreamingResponse(
-        stream_generator(),
-        media_type='text/event-stream',
-        headers={
-            'Content-Type': 'text/event-stream',
-            'Cache-Control': 'no-cache',
-            'Connection': 'keep-alive',
-            'X-Accel-Buffering': 'no',  # 禁用Nginx缓冲，提高流式响应性能
-        }
-    )
+                await upload_store.release(ref_id)
+            except Exception as release_err:
+                logger.error("释放文件引用失败: %s", release_err)
+
+        try:
+            job_id = await job_manager.start(
+                params,
+                run_admitted(ticket, review_pipeline(
+                    file_path,
+                    page_limit=request.page_limit,
+                    num_reviewers=request.num_reviewers,
+                    use_claude=request.use_claude,
+                    file_hash=file_hash,
+                )),
+                on_finish=on_finish,
+            )
+        except Exception:
+            ticket.release()
+            await upload_store.release(ref_id)
+            raise
+        logger.info("创建评审任务: %s", job_id)
+    else:
+        await upload_store.release(ref_id)
+        logger.info("复用进行中的评审任务: %s", job_id)
+
+    async def stream_generator():
+        async for rows in job_manager.subscribe(job_id):
+            # 与续传接口一样带上事件序号，断线后可将最后收到的序号作为 Last-Event-ID 续传；
+            # 记录写出耗时，客户端读取缓慢时会在这里体现
+            with metrics.sse_write_seconds.time():
+                yield "".join(f"id: {seq}\n{frame}\n\n" for seq, frame in rows)
+
+    return StreamingResponse(stream_generator(), media_type='text/event-stream', headers=SSE_HEADERS)
 
-def launch_app(host="localhost", port=5555):
+@app.get("/review/{job_id}")
+async def review_status_endpoint(job_id: str):
+    """
+    查询评审任务状态
+
+    Args:
+        job_id: 任务 ID
+
+    Returns:
+        Dict: 任务状态、参数和最后一个事件的序号
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="评审任务不存在")
+    return job
+
+@app.get("/review/{job_id}/events")
+async def review_events_endpoint(
+    job_id: str,
+    last_event_id: int = 0,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    续传评审任务的事件流
+
+    从 Last-Event-ID 请求头（EventSource 自动重连时携带）或 last_event_id 参数之后开始，
+    先回放已记录的事件，任务未结束时继续实时推送。每个事件带有 id 字段。
+
+    Args:
+        job_id: 任务 ID
+        last_event_id: 已收到的最后一个事件序号
+        last_event_id_header: Last-Event-ID 请求头
+
+    Returns:
+        StreamingResponse: 流式响应评审事件
+    """
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="评审任务不存在")
+    if last_event_id_header and last_event_id_header.strip().isdigit():
+        last_event_id = int(last_event_id_header.strip())
+
+    async def stream_generator():
+        async for rows in job_manager.subscribe(job_id, last_event_id):
+            with metrics.sse_write_seconds.time():
+                yield "".join(f"id: {seq}\n{frame}\n\n" for seq, frame in rows)
+
+    return StreamingResponse(stream_generator(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+def _is_batch_pdf(info):
+    # 跳过目录、macOS 附带的元数据文件和非 PDF 文件
+    return not info.is_dir() and not info.filename.startswith("__MACOSX/") and info.filename.lower().endswith(".pdf")
+
+
+def _count_batch_files(files):
+    """
+    统计批量上传中的论文数（在线程中执行），只读取 zip 目录，不写入任何文件
+
+    Returns:
+        int: PDF 文件数，无法读取的压缩包按一条计
+    """
+    count = 0
+    for file in files:
+        header = file.file.read(4)
+        file.file.seek(0)
+        if not header.startswith(b"PK"):
+            count += 1
+            continue
+        try:
+            with zipfile.ZipFile(file.file) as archive:
+                count += sum(1 for info in archive.infolist() if _is_batch_pdf(info))
+        except zipfile.BadZipFile:
+            count += 1
+        file.file.seek(0)
+    return count
+
+
+def _read_batch_files(files, max_bytes):
+    """
+    将批量上传的 PDF 和 zip 压缩包中的 PDF 写入临时文件（在线程中执行）
+
+    中途出错时删除已写入的临时文件。
+
+    Returns:
+        list: [(文件名, (临时文件路径, 内容哈希, 大小) 或 None, 错误信息)]
+    """
+    entries = []
+
+    def add(name, src):
+        try:
+            entries.append((name, write_part(src, max_bytes), None))
+        except ValueError as e:
+            entries.append((name, None, str(e)))
+
+    try:
+        for file in files:
+            name = os.path.basename(file.filename or "upload.pdf")
+            header = file.file.read(4)
+            file.file.seek(0)
+            if not header.startswith(b"PK"):
+                add(name, file.file)
+                continue
+            try:
+                with zipfile.ZipFile(file.file) as archive:
+                    for info in archive.infolist():
+                        if _is_batch_pdf(info):
+                            with archive.open(info) as src:
+                                add(os.path.basename(info.filename), src)
+            except zipfile.BadZipFile as e:
+                entries.append((name, None, f"压缩包无法读取: {e}"))
+    except BaseException:
+        _remove_parts(entries)
+        raise
+    return entries
+
+
+def _remove_parts(entries):
+    # 删除尚未保存到上传存储的临时文件（已保存的临时文件已被移走）
+    for _, part, _ in entries:
+        if part is None:
+            continue
+        try:
+            os.unlink(part[0])
+        except FileNotFoundError:
+            pass
+
+
+@app.post("/batch")
+async def batch_review_endpoint(
+    http_request: Request,
+    files: List[UploadFile] = File(...),
+    num_reviewers: int = Form(1),
+    page_limit: int = Form(0),
+    use_claude: bool = Form(False),
+):
+    """
+    批量评审接口：上传多个 PDF 或包含 PDF 的 zip 压缩包，为每篇论文在后台创建评审任务
+
+    批量评审只使用准入控制中分配给批量评审的名额，交互式评审优先。
+
+    Args:
+        http_request: 原始请求，用于识别客户端
+        files: PDF 文件或 zip 压缩包
+        num_reviewers: 评审者数量
+        page_limit: 页数限制，0表示不限制
+        use_claude: 是否使用 Claude 模型
+
+    Returns:
+        Dict: 批量评审 ID、进度汇总与各条目的上传结果（与查询接口相同）
+    """
+    client = client_key(http_request)
+    try:
+        rate_limiter.acquire(client)
+    except AdmissionRejected as e:
+        logger.warning("拒绝批量评审请求: %s", e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+    upload_conf = conf.get("upload", {})
+    max_bytes = int(upload_conf.get("max_size_mb", 50) * 1024 * 1024)
+    max_files = conf.get("batch", {}).get("max_files", 100)
+    entries = []
+    items = []
+    try:
+        # 写入任何文件之前检查论文数
+        count = await asyncio.to_thread(_count_batch_files, files)
+        if count > max_files:
+            raise HTTPException(status_code=413, detail=f"文件过多，一次最多 {max_files} 篇")
+        entries = await asyncio.to_thread(_read_batch_files, files, max_bytes)
+        if not any(part is not None for _, part, _ in entries):
+            errors = "；".join(f"{name}: {error}" for name, _, error in entries)
+            raise HTTPException(status_code=400, detail=f"没有可评审的 PDF 文件{'（' + errors + '）' if errors else ''}")
+
+        for file_name, part, error in entries:
+            if part is None:
+                items.append({"file_name": file_name, "error": error})
+                continue
+            part_path, file_hash, size = part
+            upload_id, _, duplicate = await upload_store.put(part_path, file_hash, size, file_name)
+            if duplicate:
+                metrics.upload_dedup_total.inc()
+            # 立即为文件加引用，排队等待的条目不会被按有效期或磁盘上限清理
+            file_path, ref_id, _ = await upload_store.acquire(upload_id=upload_id)
+            if file_path is None:
+                items.append({"file_name": file_name, "upload_id": upload_id, "error": "文件不存在"})
+                continue
+            items.append({"file_name": file_name, "upload_id": upload_id, "ref_id": ref_id})
+
+        params = {"num_reviewers": num_reviewers, "page_limit": page_limit, "use_claude": use_claude}
+        batch_id = batch_manager.start(params, items)
+    except BaseException:
+        # 批量评审没有创建：不计入限流，删除临时文件并释放已加的引用
+        rate_limiter.refund(client)
+        _remove_parts(entries)
+        for item in items:
+            await upload_store.release(item.get("ref_id"))
+        raise
+    logger.info("创建批量评审: %s，共 %s 篇", batch_id, len(items))
+    return batch_manager.get(batch_id)
+
+
+@app.get("/batch/{batch_id}")
+async def batch_status_endpoint(batch_id: str):
+    """
+    查询批量评审进度
+
+    Args:
+        batch_id: 批量评审 ID
+
+    Returns:
+        Dict: 总体进度、按状态统计的条目数和各条目的评审任务
+    """
+    batch = batch_manager.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="批量评审不存在")
+    return batch
+
+
+@app.get("/review/{job_id}/result")
+async def review_result_endpoint(job_id: str):
+    """
+    获取评审任务的结果汇总（评审内容与最终 JSON 结构），不需要读取事件流
+
+    Args:
+        job_id: 任务 ID
+
+    Returns:
+        Dict: 任务状态、各评审人的评审内容、JSON 结构化数据和错误信息
+    """
+    result = await job_manager.result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="评审任务不存在")
+    return result
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    监控指标接口（Prometheus 文本格式）
+
+    Returns:
+        PlainTextResponse: 当前 worker 进程的全部指标
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/healthz")
+async def healthz_endpoint():
+    """
+    存活检查：进程能够处理请求即返回 200
+
+    Returns:
+        Dict: 固定为 {"status": "ok"}
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz_endpoint():
+    """
+    就绪检查：启动预热完成后返回 200，预热中或正在关闭时返回 503
+
+    Returns:
+        JSONResponse: 就绪状态与各预热步骤的结果
+    """
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+def launch_app(host="localhost", port=5555, workers=None):
     """
     启动论文评审API服务
     
     Args:
         host: 主机地址，默认为127.0.0.1
         port: 端口号，默认为5555
+        workers: worker 进程数，默认读取 server.workers
     """
     import uvicorn
-    uvicorn.run(app, host=host, port=port) 
-
-# 应用关闭时关闭线程池
-@app.on_event("shutdown")
-async def shutdown_event():
-    print("[INFO] 关闭线程池...")
-    thread_pool.shutdown(wait=False)
-    print("[INFO] 线程池已关闭")
+    workers = workers or get_workers(conf)
+    # 每个 worker 进程同时处理的连接上限，超出时返回 503
+    limit_concurrency = conf.get("server", {}).get("limit_concurrency") or None
+    if workers > 1:
+        # 多进程模式下 uvicorn 需要以导入路径的形式加载应用
+        uvicorn.run("app.controller.api:app", host=host, port=port, workers=workers, limit_concurrency=limit_concurrency)
+    else:
+        uvicorn.run(app, host=host, port=port, limit_concurrency=limit_concurrency)
 
 if __name__ == "__main__":
      launch_app()
\ No newline at end of file
@@ -1,5 +1,2 @@
 # service 子模块初始化
-from .processors import process_task, process_json_task
-from .extractors import extract_pdf_text
-
-__all__ = ['process_task', 'process_json_task', 'extract_pdf_text'] 
\ No newline at end of file
+# 不在此处导入子模块：PDF 解析子进程只需要 pdf_engines，导入包时不应连带加载模型客户端、缓存等服务模块
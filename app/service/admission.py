@@ -0,0 +1,256 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+from app.service import metrics
+from app.service.streaming import format_sse
+from utils.conf import get_conf
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+admission_conf = conf.get("admission", {})
+logger = get_logger("app.service.admission")
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳（排队已满或超出客户端速率限制）"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    一次评审的准入凭证
+
+    创建时若有空闲名额则直接获准，否则在等待队列中排队，获准前可通过 wait() 获取排队位置。
+    """
+
+    def __init__(self, controller, admitted=False, batch=False):
+        self.controller = controller
+        self.admitted = admitted
+        self.batch = batch
+        self.released = False
+        self.created = time.monotonic()
+        self._changed = asyncio.Event()
+
+    def position(self):
+        """在等待队列中的位置（从 1 开始），已获准时为 0"""
+        return 0 if self.admitted else self.controller.position(self)
+
+    async def wait(self):
+        """
+        等待获准，排队位置变化时返回新的位置
+
+        Yields:
+            int: 当前排队位置
+        """
+        last = None
+        while not self.admitted:
+            position = self.position()
+            # 先清除再交出控制权，期间发生的变化不会丢失
+            self._changed.clear()
+            if position != last:
+                last = position
+                yield position
+            if not self.admitted:
+                await self._changed.wait()
+
+    def release(self):
+        """释放名额；尚在排队时退出队列"""
+        if self.released:
+            return
+        self.released = True
+        self.controller.release(self)
+
+
+class AdmissionController:
+    """
+    评审准入控制
+
+    同时进行的评审数不超过 max_active，超出的请求进入长度不超过 max_queue 的先进先出队列，
+    队列已满时直接拒绝，避免请求无限堆积导致所有评审的延迟一起变长。
+
+    批量评审使用单独的等待队列，最多同时占用 batch_max_active 个名额，并且只在没有交互式
+    请求排队时获准，交互式评审不会因批量任务而长时间等待。
+    """
+
+    def __init__(self, max_active=16, max_queue=64, batch_max_active=4):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.batch_max_active = batch_max_active
+        self.active = 0
+        self.batch_active = 0
+        self._waiting = deque()
+        self._batch_waiting = deque()
+
+    def _batch_available(self):
+        return self.active < self.max_active and self.batch_active < self.batch_max_active and not self._waiting
+
+    def admit(self, batch=False):
+        """
+        申请名额
+
+        Args:
+            batch: 是否为批量评审；批量评审的排队长度不受 max_queue 限制
+
+        Returns:
+            Ticket: 准入凭证，可能需要排队
+
+        Raises:
+            AdmissionRejected: 排队已满
+        """
+        if batch:
+            if self._batch_available() and not self._batch_waiting:
+                self.active += 1
+                self.batch_active += 1
+                self._update_metrics()
+                return Ticket(self, admitted=True, batch=True)
+            ticket = Ticket(self, batch=True)
+            self._batch_waiting.append(ticket)
+            self._update_metrics()
+            return ticket
+        if self.active < self.max_active and not self._waiting:
+            self.active += 1
+            self._update_metrics()
+            return Ticket(self, admitted=True)
+        if len(self._waiting) >= self.max_queue:
+            metrics.admission_rejected_total.inc(reason="overloaded")
+            raise AdmissionRejected("评审请求过多，请稍后重试", retry_after=admission_conf.get("overload_retry_after", 10))
+        ticket = Ticket(self)
+        self._waiting.append(ticket)
+        self._update_metrics()
+        return ticket
+
+    def position(self, ticket):
+        try:
+            return (self._batch_waiting if ticket.batch else self._waiting).index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def release(self, ticket):
+        if ticket.admitted:
+            self.active -= 1
+            if ticket.batch:
+                self.batch_active -= 1
+        else:
+            try:
+                (self._batch_waiting if ticket.batch else self._waiting).remove(ticket)
+            except ValueError:
+                pass
+        self._promote()
+
+    def _grant(self, ticket):
+        ticket.admitted = True
+        ticket._changed.set()
+        self.active += 1
+        if ticket.batch:
+            self.batch_active += 1
+        kind = "batch" if ticket.batch else "interactive"
+        metrics.admission_wait_seconds.observe(time.monotonic() - ticket.created, kind=kind)
+
+    def _promote(self):
+        # 交互式请求优先，批量评审只使用其份额内的空闲名额
+        while self.active < self.max_active and self._waiting:
+            self._grant(self._waiting.popleft())
+        while self._batch_available() and self._batch_waiting:
+            self._grant(self._batch_waiting.popleft())
+        # 队列前移，所有排队者的位置都可能变化
+        for ticket in (*self._waiting, *self._batch_waiting):
+            ticket._changed.set()
+        self._update_metrics()
+
+    def _update_metrics(self):
+        metrics.admission_active.set(self.active - self.batch_active, kind="interactive")
+        metrics.admission_active.set(self.batch_active, kind="batch")
+        metrics.admission_queued.set(len(self._waiting), kind="interactive")
+        metrics.admission_queued.set(len(self._batch_waiting), kind="batch")
+
+
+class RateLimiter:
+    """
+    按客户端（API Key 或 IP）的令牌桶限流
+
+    每个客户端每分钟补充 rate_per_minute 个令牌，最多积攒 burst 个；只记录最近活跃的
+    max_clients 个客户端，其余按最近使用时间淘汰。
+    """
+
+    def __init__(self, rate_per_minute=10, burst=5, max_clients=10000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    def acquire(self, key):
+        """
+        消耗一个令牌
+
+        Args:
+            key: 客户端标识
+
+        Raises:
+            AdmissionRejected: 令牌不足，retry_after 为下一个令牌补充前的秒数
+        """
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            metrics.admission_rejected_total.inc(reason="rate_limited")
+            raise AdmissionRejected("请求过于频繁，请稍后重试", retry_after=(1 - tokens) / self.rate)
+        self._buckets[key] = (tokens - 1, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+    def refund(self, key):
+        """
+        退还 acquire 消耗的令牌，用于请求在开始处理前被拒绝（例如排队已满）的情况
+
+        Args:
+            key: 客户端标识
+        """
+        if self.rate <= 0 or key not in self._buckets:
+            return
+        tokens, updated = self._buckets[key]
+        self._buckets[key] = (min(self.burst, tokens + 1), updated)
+
+
+async def run_admitted(ticket, pipeline):
+    """
+    获准后再运行评审流程，排队期间输出 queued 事件
+
+    Args:
+        ticket: 准入凭证
+        pipeline: 评审流程（异步生成器）
+
+    Yields:
+        str: SSE 帧
+    """
+    try:
+        async for position in ticket.wait():
+            logger.debug("评审排队中，位置: %s", position)
+            yield format_sse({
+                "type": "queued",
+                "position": position,
+                "message": f"评审排队中，前面还有 {position - 1} 个评审" if position > 1 else "评审排队中，即将开始"
+            })
+        async for frames in pipeline:
+            yield frames
+    finally:
+        ticket.release()
+        await pipeline.aclose()
+
+
+admission_controller = AdmissionController(
+    max_active=admission_conf.get("max_active_reviews", 16),
+    max_queue=admission_conf.get("max_queue", 64),
+    batch_max_active=admission_conf.get("batch_max_active_reviews", 4),
+)
+rate_limiter = RateLimiter(
+    rate_per_minute=admission_conf.get("rate_per_minute", 10),
+    burst=admission_conf.get("burst", 5),
+)
@@ -0,0 +1,278 @@
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+
+from app.service.admission import admission_controller, run_admitted
+from app.service.jobs import job_manager, FINISHED_STATUSES
+from app.service.owner import OWNER, owner_alive
+from app.service.pipeline import review_pipeline
+from app.service.storage import upload_store
+from utils.log import get_logger
+
+logger = get_logger("app.service.batch")
+
+# 批量评审条目状态；已创建评审任务的条目以任务状态为准
+ITEM_PENDING = "pending"
+ITEM_STARTED = "started"
+ITEM_REJECTED = "rejected"
+ITEM_FAILED = "failed"
+ITEM_INTERRUPTED = "interrupted"
+
+
+class BatchStore:
+    """
+    批量评审及其条目的 SQLite 存储，与评审任务位于同一个数据库，查询时直接关联任务状态
+    """
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            "id TEXT PRIMARY KEY, params TEXT NOT NULL, owner TEXT, created_at REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS batch_items ("
+            "batch_id TEXT NOT NULL, idx INTEGER NOT NULL, file_name TEXT NOT NULL, upload_id TEXT, "
+            "job_id TEXT, status TEXT NOT NULL, error TEXT, ref_id INTEGER, PRIMARY KEY (batch_id, idx))"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(batch_items)").fetchall()]
+        if "ref_id" not in columns:
+            self.db.execute("ALTER TABLE batch_items ADD COLUMN ref_id INTEGER")
+
+    def create(self, params, items, owner=OWNER):
+        """
+        Args:
+            params: 各条目共用的评审参数
+            items: [{"file_name", "upload_id", "ref_id", "error"}]，有 error 的条目直接记为 rejected
+
+        Returns:
+            str: 批量评审 ID
+        """
+        batch_id = uuid.uuid4().hex
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute(
+                "INSERT INTO batches (id, params, owner, created_at) VALUES (?, ?, ?, ?)",
+                (batch_id, json.dumps(params, ensure_ascii=False), owner, time.time()),
+            )
+            self.db.executemany(
+                "INSERT INTO batch_items (batch_id, idx, file_name, upload_id, status, error, ref_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (batch_id, i, item["file_name"], item.get("upload_id"),
+                     ITEM_REJECTED if item.get("error") else ITEM_PENDING, item.get("error"), item.get("ref_id"))
+                    for i, item in enumerate(items)
+                ],
+            )
+        return batch_id
+
+    def get(self, batch_id):
+        row = self.db.execute("SELECT params, created_at FROM batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return None
+        items = [
+            {
+                "index": idx,
+                "file_name": file_name,
+                "upload_id": upload_id,
+                "job_id": job_id,
+                "status": job_status or status,
+                "error": error,
+            }
+            for idx, file_name, upload_id, job_id, status, error, job_status in self.db.execute(
+                "SELECT i.idx, i.file_name, i.upload_id, i.job_id, i.status, i.error, j.status "
+                "FROM batch_items i LEFT JOIN jobs j ON j.id = i.job_id WHERE i.batch_id = ? ORDER BY i.idx",
+                (batch_id,),
+            ).fetchall()
+        ]
+        return {"batch_id": batch_id, "params": json.loads(row[0]), "created_at": row[1], "items": items}
+
+    def pending(self, batch_id):
+        """返回 [(序号, 上传 ID, 文件引用 ID)]"""
+        return self.db.execute(
+            "SELECT idx, upload_id, ref_id FROM batch_items WHERE batch_id = ? AND status = ? ORDER BY idx",
+            (batch_id, ITEM_PENDING),
+        ).fetchall()
+
+    def set_item(self, batch_id, idx, status, job_id=None, error=None):
+        self.db.execute(
+            "UPDATE batch_items SET status = ?, job_id = ?, error = ? WHERE batch_id = ? AND idx = ?",
+            (status, job_id, error, batch_id, idx),
+        )
+
+    def unfinished(self):
+        """返回仍有未开始条目的 [(批量评审 ID, 所属进程)]"""
+        return self.db.execute(
+            "SELECT DISTINCT b.id, b.owner FROM batches b JOIN batch_items i ON i.batch_id = b.id WHERE i.status = ?",
+            (ITEM_PENDING,),
+        ).fetchall()
+
+    def interrupt(self, batch_id, error="服务重启，批量评审被中断"):
+        """
+        将尚未开始的条目标记为中断
+
+        Returns:
+            list: 这些条目持有的文件引用 ID
+        """
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            ref_ids = [
+                row[0] for row in self.db.execute(
+                    "SELECT ref_id FROM batch_items WHERE batch_id = ? AND status = ? AND ref_id IS NOT NULL",
+                    (batch_id, ITEM_PENDING),
+                ).fetchall()
+            ]
+            self.db.execute(
+                "UPDATE batch_items SET status = ?, error = ? WHERE batch_id = ? AND status = ?",
+                (ITEM_INTERRUPTED, error, batch_id, ITEM_PENDING),
+            )
+        return ref_ids
+
+    def close(self):
+        self.db.close()
+
+
+def summarize(batch):
+    """
+    汇总批量评审进度
+
+    Args:
+        batch: BatchStore.get 的返回值
+
+    Returns:
+        dict: 在 batch 的基础上增加 status、total、done 和按状态统计的 counts
+    """
+    counts = {}
+    for item in batch["items"]:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    done = sum(count for status, count in counts.items() if status in (*FINISHED_STATUSES, ITEM_REJECTED))
+    total = len(batch["items"])
+    return {
+        **batch,
+        "status": "completed" if done == total else "running",
+        "total": total,
+        "done": done,
+        "counts": counts,
+    }
+
+
+class BatchManager:
+    """
+    在后台按顺序为批量评审的各条目创建评审任务
+
+    接收批量评审时即为每个条目的文件加引用，排队期间文件不会被清理（即使总大小超过磁盘上限）；
+    引用在条目的评审任务结束、条目失败或批量评审被中断时释放。
+
+    每个条目先以批量身份申请准入名额（只使用批量评审的份额，交互式请求优先），获准后才创建
+    评审任务，因此批量评审不会占满 PDF 解析进程和上游调用。多个批量评审各自只有一个条目在
+    排队，按先进先出轮流获得名额。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._tasks = {}
+
+    def start(self, params, items):
+        """
+        创建批量评审并在后台运行
+
+        Args:
+            params: 评审参数（num_reviewers、page_limit、use_claude）
+            items: [{"file_name", "upload_id", "ref_id", "error"}]，ref_id 为已加的文件引用，由批量评审负责释放
+
+        Returns:
+            str: 批量评审 ID
+        """
+        batch_id = self.store.create(params, items)
+        self._tasks[batch_id] = asyncio.create_task(self._run(batch_id, params))
+        return batch_id
+
+    async def _run(self, batch_id, params):
+        try:
+            for idx, upload_id, ref_id in self.store.pending(batch_id):
+                ticket = admission_controller.admit(batch=True)
+                try:
+                    async for _ in ticket.wait():
+                        pass
+                    await self._start_item(batch_id, idx, upload_id, ref_id, params, ticket)
+                except BaseException:
+                    ticket.release()
+                    raise
+        except asyncio.CancelledError:
+            await self._abandon(batch_id, "服务关闭，批量评审被中断")
+            raise
+        except Exception as e:
+            logger.exception("批量评审 %s 异常: %s", batch_id, e)
+            await self._abandon(batch_id, f"批量评审异常: {e}")
+        finally:
+            self._tasks.pop(batch_id, None)
+
+    async def _abandon(self, batch_id, error):
+        # 尚未开始的条目不会再运行，释放其文件引用
+        for ref_id in self.store.interrupt(batch_id, error):
+            try:
+                await upload_store.release(ref_id)
+            except Exception as release_err:
+                logger.error("释放文件引用失败: %s", release_err)
+
+    async def _start_item(self, batch_id, idx, upload_id, ref_id, params, ticket):
+        if ref_id is None:
+            # 升级前创建的条目没有预先加引用
+            file_path, ref_id, file_hash = await upload_store.acquire(upload_id=upload_id)
+        else:
+            file_path, file_hash = await upload_store.ref_path(ref_id)
+        if file_path is None:
+            ticket.release()
+            await upload_store.release(ref_id)
+            self.store.set_item(batch_id, idx, ITEM_FAILED, error="文件不存在")
+            return
+
+        # 与 /review 的请求参数一致，对同一上传的相同评审在交互式与批量之间也只运行一次
+        review_params = {"upload_id": upload_id, "file_hash": file_hash, **params}
+        job_id = await job_manager.find_active(review_params)
+        if job_id is not None:
+            ticket.release()
+            await upload_store.release(ref_id)
+        else:
+            async def on_finish(status):
+                try:
+                    await upload_store.release(ref_id)
+                except Exception as release_err:
+                    logger.error("释放文件引用失败: %s", release_err)
+
+            try:
+                job_id = await job_manager.start(
+                    review_params,
+                    run_admitted(ticket, review_pipeline(file_path, file_hash=file_hash, **params)),
+                    on_finish=on_finish,
+                )
+            except Exception:
+                await upload_store.release(ref_id)
+                raise
+        self.store.set_item(batch_id, idx, ITEM_STARTED, job_id=job_id)
+        logger.debug("批量评审 %s 第 %s 篇已创建评审任务: %s", batch_id, idx + 1, job_id)
+
+    def get(self, batch_id):
+        batch = self.store.get(batch_id)
+        return summarize(batch) if batch is not None else None
+
+    async def recover(self):
+        """将所属进程已经退出的批量评审中尚未开始的条目标记为中断"""
+        for batch_id, owner in self.store.unfinished():
+            if not owner_alive(owner):
+                await self._abandon(batch_id, "服务重启，批量评审被中断")
+
+    async def shutdown(self):
+        """停止创建新的评审任务，尚未开始的条目标记为中断；已创建的任务由 JobManager 处理"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+batch_manager = BatchManager(BatchStore(job_manager.store.db_path))
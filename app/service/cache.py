@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import uuid
+from collections import OrderedDict
+
+from utils.conf import get_conf, ROOT_DIR
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.cache")
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    计算文件内容的 SHA-256
+
+    Args:
+        path: 文件路径
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resolve_cache_dir(*parts):
+    """返回缓存目录下的子目录（相对路径按项目根目录解析），不存在时自动创建"""
+    base = conf.get("cache", {}).get("dir", "cache")
+    if not os.path.isabs(base):
+        base = os.path.join(ROOT_DIR, base)
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class TextCache:
+    """
+    PDF 提取文本缓存，以文件内容哈希为键
+
+    内存中保留最近使用的若干条记录，磁盘上以 JSON 文件保存，超过上限时
+    按最近访问时间淘汰。每条记录保存总页数和已提取的前若干页文本。
+    内存部分只在事件循环中访问；磁盘读写和淘汰在线程中执行，不阻塞其他请求。
+    """
+
+    def __init__(self, cache_dir, memory_entries=32, disk_entries=512):
+        self.cache_dir = cache_dir
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    async def get(self, key):
+        """
+        读取缓存记录
+
+        Args:
+            key: 文件内容哈希
+
+        Returns:
+            dict: {"num_pages": int, "pages": [str]}，未命中时返回 None
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        entry = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    async def put(self, key, num_pages, pages):
+        """
+        写入缓存记录
+
+        Args:
+            key: 文件内容哈希
+            num_pages: PDF 总页数
+            pages: 从第一页开始的每页文本
+        """
+        entry = {"num_pages": num_pages, "pages": list(pages)}
+        self._remember(key, entry)
+        await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, entry)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # 更新访问时间，供磁盘淘汰使用
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def _write_disk(self, key, entry):
+        # 先写临时文件再替换，避免并发读取到半截内容
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("文本缓存写入失败: %s", e)
+            return
+        self._evict_disk()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        try:
+            files = [
+                os.path.join(self.cache_dir, name)
+                for name in os.listdir(self.cache_dir)
+                if name.endswith(".json")
+            ]
+            if len(files) <= self.disk_entries:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.disk_entries]:
+                os.unlink(path)
+        except OSError as e:
+            logger.error("文本缓存淘汰失败: %s", e)
+
+
+def result_cache_key(**parts):
+    """根据影响评审输出的各项参数计算评审结果缓存的键"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    评审结果缓存，保存一次完整评审输出的 SSE 帧序列用于回放
+
+    记录按 JSON 文件保存在磁盘上，超过有效期的记录在读取时丢弃；
+    写入后按最近访问时间淘汰，直到记录数和总大小都不超过上限。
+    """
+
+    def __init__(self, cache_dir, ttl_seconds=86400, max_entries=1000, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        读取缓存的 SSE 帧序列
+
+        Args:
+            key: result_cache_key 计算的键
+
+        Returns:
+            list: SSE 帧列表，未命中或已过期时返回 None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["frames"]
+
+    def put(self, key, frames):
+        """
+        保存一次评审输出的 SSE 帧序列
+
+        Args:
+            key: result_cache_key 计算的键
+            frames: SSE 帧列表
+        """
+        entry = {"created": time.time(), "frames": list(frames)}
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error("评审结果缓存写入失败: %s", e)
+            return
+        self._evict()
+
+    def _evict(self):
+        try:
+            now = time.time()
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                # 最近访问时间早于有效期的记录一定已经过期
+                if now - stat.st_mtime > self.ttl_seconds:
+                    os.unlink(path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            files.sort()
+            total_bytes = sum(size for _, size, _ in files)
+            while files and (len(files) > self.max_entries or total_bytes > self.max_bytes):
+                _, size, path = files.pop(0)
+                os.unlink(path)
+                total_bytes -= size
+        except OSError as e:
+            logger.error("评审结果缓存淘汰失败: %s", e)
+
+
+_cache_conf = conf.get("cache", {})
+text_cache = TextCache(
+    resolve_cache_dir("text"),
+    memory_entries=_cache_conf.get("text_memory_entries", 32),
+    disk_entries=_cache_conf.get("text_disk_entries", 512),
+)
+
+_result_conf = conf.get("result_cache", {})
+# 未启用时为 None
+result_cache = ResultCache(
+    resolve_cache_dir("results"),
+    ttl_seconds=_result_conf.get("ttl_hours", 24) * 3600,
+    max_entries=_result_conf.get("max_entries", 1000),
+    max_bytes=_result_conf.get("max_mb", 512) * 1024 * 1024,
+) if _result_conf.get("enabled", True) else None
@@ -0,0 +1,94 @@
+import re
+
+# 中文章节编号：第X章/节、一、（一）
+CHINESE_HEADING = (
+    r"第[一二三四五六七八九十百零\d]+[章节部分篇]"
+    r"|[一二三四五六七八九十]+[、.．]"
+    r"|[（(][一二三四五六七八九十]+[）)]"
+)
+# 章节标题：中文章节编号、阿拉伯数字编号以及常见的固定标题
+HEADING_PATTERN = re.compile(
+    r"^\s*("
+    + CHINESE_HEADING +
+    r"|\d+(\.\d+){0,2}[、.．\s]\s*[^\d\s.．]"
+    r"|(摘\s*要|abstract|引\s*言|前\s*言|绪\s*论|introduction|结\s*论|conclusions?|致\s*谢|参考文献|references)\s*$"
+    r")",
+    re.IGNORECASE,
+)
+
+# 标题行的最大长度，超过时视为正文
+MAX_HEADING_CHARS = 40
+
+
+def _is_heading(line):
+    stripped = line.strip()
+    return 0 < len(stripped) <= MAX_HEADING_CHARS and HEADING_PATTERN.match(stripped) is not None
+
+
+def split_sections(text):
+    """
+    按章节标题将论文文本切分为若干段
+
+    Args:
+        text: 论文全文
+
+    Returns:
+        list: 每个元素为一个章节的文本（包含标题行）
+    """
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if _is_heading(line) and any(l.strip() for l in current):
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+    return [section for section in sections if section.strip()]
+
+
+def _split_oversized(section, max_chars):
+    """将超长章节按段落切分，单个段落仍超长时按长度硬切分"""
+    pieces = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", section):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_paper(text, max_chars):
+    """
+    将论文文本切分为不超过 max_chars 的分段，尽量保持章节完整
+
+    相邻的短章节会合并到同一分段中，超长章节按段落继续切分。
+
+    Args:
+        text: 论文全文
+        max_chars: 每个分段的最大字符数
+
+    Returns:
+        list: 分段文本列表，按原文顺序排列
+    """
+    chunks = []
+    current = ""
+    for section in split_sections(text):
+        pieces = [section] if len(section) <= max_chars else _split_oversized(section, max_chars)
+        for piece in pieces:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
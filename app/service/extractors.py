@@ -1,78 +1,238 @@
 import os
 import json
 import asyncio
-import PyPDF2
+import multiprocessing
+import time
+import hashlib
+import concurrent.futures
 
-async def extract_pdf_text(pdf_path, page_limit):
+from app.service import metrics
+from app.service import pdf_engines
+from app.service.cache import text_cache
+from utils.conf import get_conf, get_workers
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.extractors")
+extract_conf = conf.get("extract", {})
+
+# PDF 解析进程池，首次使用时创建
+_process_pool = None
+
+
+# 进程池大小，创建进程池时确定
+_pool_workers = 0
+
+
+def get_process_pool():
+    """获取（必要时创建）PDF 解析进程池"""
+    global _process_pool, _pool_workers
+    if _process_pool is None:
+        # 未配置时由各 worker 进程平分 CPU 核数，避免多进程部署时解析进程过多
+        workers = extract_conf.get("workers") or max(1, (os.cpu_count() or 1) // get_workers(conf))
+        # 使用 spawn 启动子进程，避免在多线程的服务进程中 fork
+        _process_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        metrics.extract_workers.set(workers)
+        _pool_workers = workers
+    return _process_pool
+
+
+async def warm_process_pool():
     """
-    异步提取PDF文本内容，优化版本
+    预先启动全部解析进程并导入 PDF 解析库，首个评审不再承担进程启动和导入的耗时
+
+    Returns:
+        int: 已启动的解析进程数
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    # 同时提交与进程数相同的任务，进程池会为每个任务启动一个进程；
+    # 子进程只导入 pdf_engines，不加载其他服务模块
+    engines = engine_options()["engines"]
+    pids = await asyncio.gather(*(loop.run_in_executor(pool, pdf_engines.warm, engines) for _ in range(_pool_workers)))
+    return len(set(pids))
+
+
+def shutdown_process_pool():
+    """关闭 PDF 解析进程池"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def engine_options():
+    """
+    解析引擎的配置
+
+    Returns:
+        dict: 按尝试顺序排列的已安装引擎 engines，以及 probe_pages、min_quality、min_chars_per_page、max_fallbacks
+    """
+    return {
+        "engines": pdf_engines.candidate_engines(extract_conf.get("engine", "auto"), extract_conf.get("engines")),
+        "probe_pages": extract_conf.get("probe_pages", 3),
+        "min_quality": extract_conf.get("min_quality", 0.8),
+        "min_chars_per_page": extract_conf.get("min_chars_per_page", 20),
+        "max_fallbacks": extract_conf.get("max_fallbacks", 1),
+    }
+
+def text_cache_key(file_hash, options):
+    """
+    提取文本缓存的键：文件内容哈希加上影响提取结果的引擎配置，修改引擎配置或安装新的引擎后不会读到旧的文本
+
+    Args:
+        file_hash: 文件内容哈希
+        options: engine_options 的返回值
+
+    Returns:
+        str: SHA-256
+    """
+    return hashlib.sha256(json.dumps([file_hash, options], sort_keys=True).encode("utf-8")).hexdigest()
+
+async def extract_pdf_text(pdf_path, page_limit, file_hash=None):
+    """
+    异步提取PDF文本内容，解析在进程池中按页段并行执行，不阻塞事件循环
     
     Args:
         pdf_path: PDF文件路径
         page_limit: 页数限制，0表示不限制
+        file_hash: 文件内容哈希，提供时优先读取文本缓存
         
     Yields:
         str: 进度消息或最终文本内容
     """
     all_text = ""
+    started = time.monotonic()
     
     try:
-        print(f"[DEBUG] 开始读取PDF文件: {pdf_path}")
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            num_pages = len(reader.pages)
-            print(f"[DEBUG] PDF读取成功，共 {num_pages} 页")
-            
-            # 确定要处理的页数
+        # 命中缓存且已缓存的页数足够时，直接返回缓存文本，跳过PDF解析
+        options = engine_options()
+        cache_key = text_cache_key(file_hash, options) if file_hash else None
+        cached = await text_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            num_pages = cached["num_pages"]
             pages_to_load = num_pages
             if page_limit > 0 and page_limit < num_pages:
                 pages_to_load = page_limit
-            
-            # 优化：使用批量处理，每次处理多页
-            batch_size = min(5, pages_to_load)  # 每批最多处理5页，或者实际页数
-            page_texts = []  # 存储每页文本
-            
-            # 预先准备页面索引列表
-            page_indices = range(pages_to_load)
-            
-            for batch_start in range(0, pages_to_load, batch_size):
-                batch_end = min(batch_start + batch_size, pages_to_load)
-                batch_pages = list(page_indices[batch_start:batch_end])
-                
-                # 处理当前批次的页面
-                for i in batch_pages:
-                    print(f"[DEBUG] 正在提取第 {i+1}/{pages_to_load} 页")
-                    page = reader.pages[i]
-                    text = page.extract_text()
-                    page_texts.append(text)
-                    
-                    # 生成进度信息并立即返回，保持UI响应
-                    progress = {
-                        "type": "progress",
-                        "current": i + 1,
-                        "total": pages_to_load,
-                        "message": f"正在处理第 {i + 1}/{pages_to_load} 页"
-                    }
-                    # 直接生成进度消息
-                    yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
-                
-                # 批次处理之间的间隔非常短，只是让出控制权
-                await asyncio.sleep(0.0001)
-            
-            # 合并所有页面的文本
-            all_text = "\n\n".join(page_texts)
-            
-            # 最后yield文本内容，而不是return
-            text_result = {
-                "type": "extracted_text",
-                "text": all_text
+            if len(cached["pages"]) >= pages_to_load:
+                logger.debug("命中文本缓存: %s，共 %s 页", file_hash, pages_to_load)
+                metrics.cache_requests_total.inc(cache="text", result="hit")
+                metrics.extract_seconds.observe(time.monotonic() - started, cached="true")
+                progress = {
+                    "type": "progress",
+                    "current": pages_to_load,
+                    "total": pages_to_load,
+                    "message": f"命中文本缓存，已跳过PDF解析（{pages_to_load} 页）",
+                    "cached": True
+                }
+                yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
+                text_result = {
+                    "type": "extracted_text",
+                    "text": "\n\n".join(cached["pages"][:pages_to_load]),
+                    "pages": cached["pages"][:pages_to_load],
+                    "cached": True
+                }
+                yield json.dumps(text_result, ensure_ascii=False)
+                return
+
+        if file_hash:
+            metrics.cache_requests_total.inc(cache="text", result="miss")
+        logger.debug("开始读取PDF文件: %s", pdf_path)
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        # 按配置的顺序试提取开头几页，为本文档选择第一个质量合格的引擎，试提取的文本直接使用
+        engine, num_pages, probed = await loop.run_in_executor(
+            pool, pdf_engines.select_engine, pdf_path, options["engines"],
+            options["probe_pages"], options["min_quality"], options["min_chars_per_page"],
+        )
+        logger.debug("PDF读取成功，共 %s 页，解析引擎: %s", num_pages, engine)
+        # 选定的引擎在前，其余引擎作为文本为空或乱码时的备选
+        engines = [engine] + [name for name in options["engines"] if name != engine]
+
+        # 确定要处理的页数
+        pages_to_load = num_pages
+        if page_limit > 0 and page_limit < num_pages:
+            pages_to_load = page_limit
+
+        # 按页段拆分到多个进程并行提取，完成一段就返回一次进度
+        batch_size = max(1, extract_conf.get("pages_per_task", 4))
+        page_texts = [None] * pages_to_load  # 按页码顺序存储每页文本
+        probed = probed[:pages_to_load]
+        page_texts[:len(probed)] = probed
+        metrics.extract_engine_pages_total.inc(len(probed), engine=engine)
+
+        async def run_batch(start, end):
+            with metrics.extract_inflight.track():
+                texts, used = await loop.run_in_executor(
+                    pool, pdf_engines.extract_range, pdf_path, start, end, engines,
+                    options["min_quality"], options["min_chars_per_page"], options["max_fallbacks"],
+                )
+            metrics.extract_engine_pages_total.inc(len(texts), engine=used)
+            if used != engine:
+                logger.debug("第 %s-%s 页的文本为空或乱码，改用 %s", start + 1, end, used)
+                metrics.extract_fallback_total.inc(engine=engine)
+            return start, texts
+
+        batches = [
+            asyncio.ensure_future(run_batch(start, min(start + batch_size, pages_to_load)))
+            for start in range(len(probed), pages_to_load, batch_size)
+        ]
+        try:
+            pages_done = len(probed)
+            progress = {
+                "type": "progress",
+                "current": pages_done,
+                "total": pages_to_load,
+                "message": f"正在处理第 {pages_done}/{pages_to_load} 页"
             }
-            yield json.dumps(text_result, ensure_ascii=False)
+            yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
+            for next_done in asyncio.as_completed(batches):
+                start, texts = await next_done
+                page_texts[start:start + len(texts)] = texts
+                pages_done += len(texts)
+                logger.debug("已提取第 %s-%s 页，进度 %s/%s", start + 1, start + len(texts), pages_done, pages_to_load)
+
+                # 生成进度信息并立即返回，保持UI响应
+                progress = {
+                    "type": "progress",
+                    "current": pages_done,
+                    "total": pages_to_load,
+                    "message": f"正在处理第 {pages_done}/{pages_to_load} 页"
+                }
+                yield f"data: {json.dumps(progress, ensure_ascii=False)}\n\n"
+        finally:
+            # 提前退出（例如客户端断开）时取消尚未开始的页段
+            for batch in batches:
+                batch.cancel()
+
+        # 合并所有页面的文本
+        all_text = "\n\n".join(page_texts)
+        elapsed = time.monotonic() - started
+        metrics.extract_seconds.observe(elapsed, cached="false")
+        metrics.extract_pages_total.inc(pages_to_load)
+        if elapsed > 0:
+            metrics.extract_pages_per_second.observe(pages_to_load / elapsed)
+
+        # 写入缓存（不覆盖已缓存的更多页）
+        if cache_key and (cached is None or len(cached["pages"]) < len(page_texts)):
+            await text_cache.put(cache_key, num_pages, page_texts)
+
+        # 最后yield文本内容，而不是return
+        text_result = {
+            "type": "extracted_text",
+            "text": all_text,
+            "pages": page_texts,
+            "engine": engine,
+            "cached": False
+        }
+        yield json.dumps(text_result, ensure_ascii=False)
             
     except Exception as e:
-        import traceback
-        print(f"[ERROR] PDF提取异常: {str(e)}")
-        print(f"[ERROR] PDF提取异常堆栈: {traceback.format_exc()}")
+        logger.exception("PDF提取异常: %s", e)
         error_result = {
             "type": "error",
             "message": str(e)
@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import concurrent.futures
+
+from app.service import metrics
+from app.service.cache import resolve_cache_dir
+from app.service.owner import OWNER, owner_alive
+from app.service.streaming import format_sse
+from utils.conf import get_conf
+from utils.log import get_logger, job_id_var
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.jobs")
+jobs_conf = conf.get("jobs", {})
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+FINISHED_STATUSES = (COMPLETED, FAILED, INTERRUPTED)
+
+
+def canonical_params(params):
+    return json.dumps(params, ensure_ascii=False, sort_keys=True)
+
+
+def split_frames(frames):
+    """将一个或多个 SSE 帧拆分为单个帧（去掉结尾的空行）"""
+    return [frame for frame in frames.split("\n\n") if frame.strip()]
+
+
+def frame_type(frame):
+    """返回单个 SSE 帧中事件的类型"""
+    try:
+        return json.loads(frame[len("data: "):]).get("type")
+    except (ValueError, AttributeError):
+        return None
+
+
+class JobStore:
+    """
+    评审任务与事件日志的 SQLite 存储
+
+    每个任务的事件按顺序追加，序号从 1 开始，作为 SSE 的事件 ID 用于断点续传。
+
+    任务创建、事件追加和状态更新（create、append、set_status）使用单独的连接，在专用的写入线程中
+    按提交顺序执行，多进程部署时等待数据库写锁（最长 busy_timeout）不会阻塞事件循环；
+    查询（get、events_after、find_unfinished）在专用的读取线程中执行。启动时的恢复与清理
+    （unfinished、interrupt、purge）在服务开始处理请求之前同步执行。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.db = self._connect()
+        self._write_db = self._connect()
+        self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-writer")
+        self._reader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-reader")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "last_seq INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(jobs)").fetchall()]
+        if "owner" not in columns:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "job_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (job_id, seq))"
+        )
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        return db
+
+    async def _write(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._writer, func, *args)
+
+    async def _read(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._reader, func, *args)
+
+    async def create(self, job_id, params, owner=OWNER):
+        await self._write(self._create, job_id, params, owner)
+
+    def _create(self, job_id, params, owner):
+        now = time.time()
+        self._write_db.execute(
+            "INSERT INTO jobs (id, status, params, owner, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, PENDING, canonical_params(params), owner, now, now),
+        )
+
+    async def find_unfinished(self, params):
+        """返回参数相同、仍在进行中的任务 ID（可能由其他进程运行）"""
+        return await self._read(self._find_unfinished, params)
+
+    def _find_unfinished(self, params):
+        rows = self.db.execute(
+            "SELECT id, owner FROM jobs WHERE params = ? AND status NOT IN (?, ?, ?) ORDER BY created_at DESC",
+            (canonical_params(params), *FINISHED_STATUSES),
+        ).fetchall()
+        for job_id, owner in rows:
+            if owner_alive(owner):
+                return job_id
+        return None
+
+    async def get(self, job_id):
+        return await self._read(self._get, job_id)
+
+    def _get(self, job_id):
+        row = self.db.execute(
+            "SELECT id, status, params, last_seq, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        params = json.loads(row[2])
+        # 旧版本记录的参数中包含服务器上的文件路径，不对外返回
+        params.pop("file_path", None)
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "params": params,
+            "last_event_id": row[3],
+            "created_at": row[4],
+            "updated_at": row[5],
+        }
+
+    async def set_status(self, job_id, status):
+        await self._write(self._set_status, job_id, status)
+
+    def _set_status(self, job_id, status):
+        self._write_db.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+            (status, time.time(), job_id),
+        )
+
+    async def append(self, job_id, frames):
+        """
+        追加事件，返回最后一个事件的序号
+
+        Args:
+            job_id: 任务 ID
+            frames: 单个 SSE 帧列表
+        """
+        return await self._write(self._append, job_id, frames)
+
+    def _append(self, job_id, frames):
+        db = self._write_db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            last_seq = db.execute("SELECT last_seq FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            rows = [(job_id, last_seq + i + 1, frame) for i, frame in enumerate(frames)]
+            db.executemany("INSERT INTO events (job_id, seq, data) VALUES (?, ?, ?)", rows)
+            last_seq += len(rows)
+            db.execute(
+                "UPDATE jobs SET last_seq = ?, updated_at = ? WHERE id = ?",
+                (last_seq, time.time(), job_id),
+            )
+        return last_seq
+
+    async def events_after(self, job_id, seq):
+        """
+        Returns:
+            list: 序号大于 seq 的事件 [(序号, SSE 帧)]
+        """
+        return await self._read(self._events_after, job_id, seq)
+
+    def _events_after(self, job_id, seq):
+        return self.db.execute(
+            "SELECT seq, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, seq),
+        ).fetchall()
+
+    def unfinished(self):
+        """返回 [(任务 ID, 所属进程)]"""
+        return self.db.execute(
+            "SELECT id, owner FROM jobs WHERE status NOT IN (?, ?, ?)", FINISHED_STATUSES
+        ).fetchall()
+
+    def interrupt(self, job_id, message):
+        """
+        将未结束的任务标记为中断并追加错误事件
+
+        多个进程同时恢复时只有一个进程会成功，返回是否由本次调用完成标记。
+        """
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            cursor = self.db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status NOT IN (?, ?, ?)",
+                (INTERRUPTED, time.time(), job_id, *FINISHED_STATUSES),
+            )
+            if cursor.rowcount == 0:
+                return False
+            last_seq = self.db.execute("SELECT last_seq FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            self.db.execute(
+                "INSERT INTO events (job_id, seq, data) VALUES (?, ?, ?)",
+                (job_id, last_seq + 1, split_frames(format_sse({"type": "error", "message": message}))[0]),
+            )
+            self.db.execute("UPDATE jobs SET last_seq = ? WHERE id = ?", (last_seq + 1, job_id))
+        return True
+
+    def purge(self, before):
+        """删除在 before 之前结束的任务及其事件"""
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            ids = [
+                row[0] for row in self.db.execute(
+                    "SELECT id FROM jobs WHERE updated_at < ? AND status IN (?, ?, ?)",
+                    (before, *FINISHED_STATUSES),
+                ).fetchall()
+            ]
+            self.db.executemany("DELETE FROM events WHERE job_id = ?", [(i,) for i in ids])
+            self.db.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        return len(ids)
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._reader.shutdown(wait=True)
+        self._write_db.close()
+        self.db.close()
+
+
+class JobManager:
+    """
+    在后台运行评审任务，与客户端连接的生命周期解耦
+
+    评审流程输出的每个 SSE 帧都写入事件日志；客户端可以随时从任意序号之后订阅，
+    断线重连不会重复调用模型。相同参数的评审正在进行时，新请求直接复用该任务。
+    """
+
+    def __init__(self, store, poll_interval=0.5):
+        self.store = store
+        self.poll_interval = poll_interval
+        self._tasks = {}
+        self._signals = {}
+        self._active_keys = {}
+
+    def _notify(self, job_id):
+        signal = self._signals.get(job_id)
+        if signal is not None:
+            self._signals[job_id] = asyncio.Event()
+            signal.set()
+
+    async def find_active(self, params):
+        """返回参数完全相同、仍在进行中的任务 ID，包括其他 worker 进程中运行的任务"""
+        return self._active_keys.get(canonical_params(params)) or await self.store.find_unfinished(params)
+
+    async def start(self, params, pipeline, on_finish=None):
+        """
+        创建任务并在后台运行
+
+        Args:
+            params: 评审参数（用于记录和去重）
+            pipeline: 产生 SSE 帧的异步生成器
+            on_finish: 任务结束后的回调（协程函数），参数为最终状态
+
+        Returns:
+            str: 任务 ID
+        """
+        # 先登记再写入数据库，等待写入期间到达的相同请求直接复用该任务
+        job_id = uuid.uuid4().hex
+        key = canonical_params(params)
+        self._active_keys[key] = job_id
+        self._signals[job_id] = asyncio.Event()
+        try:
+            await self.store.create(job_id, params)
+        except BaseException:
+            self._active_keys.pop(key, None)
+            self._signals.pop(job_id, None)
+            raise
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, key, pipeline, on_finish))
+        return job_id
+
+    async def _run(self, job_id, key, pipeline, on_finish):
+        # 任务内（包括其派生的处理任务）的日志都带上任务 ID
+        job_id_var.set(job_id)
+        status = FAILED
+        last_type = None
+        started = time.monotonic()
+        metrics.reviews_active.inc()
+        try:
+            # 第一条事件为任务信息，在写入线程中与后续事件按顺序写入
+            await self.store.append(job_id, split_frames(format_sse({"type": "job", "job_id": job_id})))
+            await self.store.set_status(job_id, RUNNING)
+            self._notify(job_id)
+            async for frames in pipeline:
+                batch = split_frames(frames)
+                if not batch:
+                    continue
+                await self.store.append(job_id, batch)
+                last_type = frame_type(batch[-1])
+                self._notify(job_id)
+            status = COMPLETED if last_type == "complete" else FAILED
+        except asyncio.CancelledError:
+            status = INTERRUPTED
+            await self.store.append(job_id, split_frames(format_sse({"type": "error", "message": "评审任务被中断"})))
+            raise
+        except Exception as e:
+            logger.exception("评审任务 %s 异常: %s", job_id, e)
+            await self.store.append(job_id, split_frames(format_sse({"type": "error", "message": str(e)})))
+        finally:
+            metrics.reviews_active.dec()
+            metrics.reviews_total.inc(status=status)
+            metrics.review_seconds.observe(time.monotonic() - started, status=status)
+            await self.store.set_status(job_id, status)
+            self._active_keys.pop(key, None)
+            self._tasks.pop(job_id, None)
+            self._notify(job_id)
+            self._signals.pop(job_id, None)
+            if on_finish is not None:
+                try:
+                    await on_finish(status)
+                except Exception as e:
+                    logger.error("评审任务 %s 结束回调异常: %s", job_id, e)
+
+    async def get(self, job_id):
+        return await self.store.get(job_id)
+
+    async def result(self, job_id):
+        """
+        从事件日志中汇总评审结果，供批量评审等不读取事件流的调用方使用
+
+        Args:
+            job_id: 任务 ID
+
+        Returns:
+            dict: 任务状态、各评审人的评审内容、最终的 JSON 结构化数据及错误信息；任务不存在时返回 None
+        """
+        job = await self.store.get(job_id)
+        if job is None:
+            return None
+        reviews = {}
+        result = {"job_id": job_id, "status": job["status"], "reviews": [], "json_complete": None, "valid": None, "error": None}
+        for _, frame in await self.store.events_after(job_id, 0):
+            try:
+                event = json.loads(frame[len("data: "):])
+            except ValueError:
+                continue
+            event_type = event.get("type")
+            if event_type == "content":
+                reviewer = event.get("reviewer")
+                reviews[reviewer] = reviews.get(reviewer, "") + event.get("content", "")
+            elif event_type == "json_complete" and "reviewer" not in event:
+                # 多评审人时不带编号的 json_complete 为合并结果
+                result["json_complete"] = event.get("json_complete")
+                result["valid"] = event.get("valid")
+            elif event_type == "error":
+                result["error"] = event.get("message")
+        result["reviews"] = [{"reviewer": reviewer, "content": content} for reviewer, content in reviews.items()]
+        return result
+
+    async def subscribe(self, job_id, last_seq=0):
+        """
+        订阅任务事件，从 last_seq 之后开始，直到任务结束且事件全部读取
+
+        Args:
+            job_id: 任务 ID
+            last_seq: 客户端已收到的最后一个事件序号
+
+        Yields:
+            list: [(序号, SSE 帧)]，每次返回当前可读的全部新事件
+        """
+        while True:
+            # 先取通知对象再读日志，避免错过两者之间追加的事件
+            signal = self._signals.get(job_id)
+            rows = await self.store.events_after(job_id, last_seq)
+            if rows:
+                last_seq = rows[-1][0]
+                yield rows
+                continue
+
+            if signal is not None:
+                # 任务在本进程中运行，结束时通知对象被移除，之后再读取一次剩余事件和状态
+                await signal.wait()
+                continue
+            job = await self.store.get(job_id)
+            if job is None or job["status"] in FINISHED_STATUSES:
+                return
+            # 任务在其他进程中运行时，只能轮询事件日志
+            await asyncio.sleep(self.poll_interval)
+
+    def recover(self):
+        """将所属进程已经退出、但仍未结束的任务标记为中断"""
+        for job_id, owner in self.store.unfinished():
+            if not owner_alive(owner):
+                self.store.interrupt(job_id, "服务重启，评审任务被中断")
+        retention = jobs_conf.get("retention_hours", 72) * 3600
+        self.store.purge(time.time() - retention)
+
+    async def shutdown(self):
+        """取消所有进行中的任务"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _db_path():
+    path = jobs_conf.get("db", "jobs.db")
+    if not os.path.isabs(path):
+        path = os.path.join(resolve_cache_dir(), path)
+    return path
+
+
+job_manager = JobManager(JobStore(_db_path()), poll_interval=jobs_conf.get("poll_interval", 0.5))
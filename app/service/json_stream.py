@@ -0,0 +1,254 @@
+import re
+import json
+
+# Json_prompt.md 中约定的顶层字段及其类型
+EXPECTED_FIELDS = {
+    "formTitle": str,
+    "projectInfo": dict,
+    "evaluationSections": list,
+    "textualEvaluations": list,
+}
+
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_IDENTIFIER = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+
+
+def repair_json(text):
+    """
+    修复模型输出中常见的 JSON 格式问题并解析
+
+    处理代码块包裹、对象前后的多余文字、未加引号的属性名、多余的尾逗号，
+    以及输出被截断导致的未闭合字符串和括号。
+
+    Args:
+        text: 模型输出的文本
+
+    Returns:
+        解析得到的对象，无法修复时返回 None
+    """
+    if not text:
+        return None
+    text = _CODE_FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    out = []
+    stack = []
+    # 各层未闭合对象中当前成员在 out 中的起始位置及是否已经出现冒号（数组层为 None），截断时用于去掉没有值的属性名
+    members = []
+    in_string = False
+    escape = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                # 字符串中的裸换行不合法，转义后保留
+                out[-1] = "\\n"
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            members.append([len(out), False] if ch == "{" else None)
+        elif ch in ",:":
+            out.append(ch)
+            if members and members[-1] is not None:
+                if ch == ",":
+                    members[-1] = [len(out), False]
+                else:
+                    members[-1][1] = True
+        elif ch in "}]":
+            # 去掉右括号前多余的逗号
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+                members.pop()
+            out.append(ch)
+            if not stack:
+                break
+        elif ch.isascii() and (ch.isalpha() or ch in "_$"):
+            match = _IDENTIFIER.match(text, i)
+            word = match.group(0)
+            rest = text[match.end():].lstrip()
+            if rest.startswith(":") and word not in ("true", "false", "null"):
+                # 未加引号的属性名
+                out.append(f'"{word}"')
+            else:
+                out.append(word)
+            i = match.end()
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # 输出被截断：闭合字符串，去掉悬空的逗号/冒号，再补齐括号
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    dangling_colon = False
+    while out and (out[-1].isspace() or out[-1] in ",:"):
+        dangling_colon = dangling_colon or out[-1] == ":"
+        out.pop()
+    member = members[-1] if members else None
+    if member is not None and (dangling_colon or not member[1]):
+        # 只有属性名、还没有值的成员整个去掉
+        del out[member[0]:]
+        while out and (out[-1].isspace() or out[-1] == ","):
+            out.pop()
+    out.extend(reversed(stack))
+
+    try:
+        return json.loads("".join(out))
+    except ValueError:
+        return None
+
+
+def validate_field(key, value):
+    """
+    按 Json_prompt.md 的结构检查顶层字段
+
+    Args:
+        key: 字段名
+        value: 字段值
+
+    Returns:
+        bool: 字段是否符合预期结构
+    """
+    expected = EXPECTED_FIELDS.get(key)
+    if expected is None or not isinstance(value, expected):
+        return False
+    if key == "evaluationSections":
+        for section in value:
+            if not isinstance(section, dict) or "id" not in section:
+                return False
+            options = section.get("options")
+            if options and section.get("aiRecommendation") not in options:
+                return False
+    if key == "textualEvaluations":
+        for item in value:
+            if not isinstance(item, dict) or "id" not in item:
+                return False
+    return True
+
+
+class IncrementalJSONParser:
+    """
+    增量解析流式输出的 JSON 对象
+
+    逐段接收模型输出，从第一个 { 开始跟踪字符串和括号层级（之前的代码块标记或说明文字，
+    包括其中的方括号，都不参与解析）；每当一个顶层字段的值完整结束（遇到顶层逗号或对象闭合），
+    立即解析并返回该字段，无需等待整个对象生成完毕。
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._field_parts = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._finished = False
+
+    def feed(self, chunk):
+        """
+        输入一段模型输出
+
+        Args:
+            chunk: 新到达的文本片段
+
+        Returns:
+            list: 本段内完成的顶层字段 [(字段名, 字段值)]
+        """
+        self._parts.append(chunk)
+        if self._finished:
+            return []
+
+        fields = []
+        segment_start = 0
+        for i, ch in enumerate(chunk):
+            if not self._started:
+                if ch != "{":
+                    continue
+                # 顶层对象开始，之前的内容（例如代码块标记、说明文字）丢弃
+                self._started = True
+                self._depth = 1
+                segment_start = i + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._field_parts.append(chunk[segment_start:i])
+                    fields.extend(self._take_field())
+                    self._finished = True
+                    return fields
+            elif ch == "," and self._depth == 1:
+                self._field_parts.append(chunk[segment_start:i])
+                fields.extend(self._take_field())
+                segment_start = i + 1
+
+        if self._depth >= 1:
+            self._field_parts.append(chunk[segment_start:])
+        return fields
+
+    def _take_field(self):
+        segment = "".join(self._field_parts).strip()
+        self._field_parts = []
+        if not segment:
+            return []
+        parsed = repair_json("{" + segment + "}")
+        if not isinstance(parsed, dict):
+            return []
+        return list(parsed.items())
+
+    @property
+    def text(self):
+        """目前为止收到的完整输出"""
+        return "".join(self._parts)
+
+    def result(self):
+        """
+        解析完整输出，必要时进行修复
+
+        Returns:
+            dict: 解析得到的对象，无法解析时返回 None
+        """
+        parsed = repair_json(self.text)
+        return parsed if isinstance(parsed, dict) else None
@@ -0,0 +1,289 @@
+import time
+import asyncio
+import contextvars
+
+from app.service import metrics
+from utils.conf import get_conf
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.llm")
+router_conf = conf.get("router", {})
+
+# 当前评审优先使用的提供方名称（例如 use_claude 时为 "openrouter"），由请求入口设置，
+# 通过 asyncio 任务的上下文自动传递给各处理任务
+preferred_provider = contextvars.ContextVar("preferred_provider", default=None)
+# 本次评审实际输出结果的提供方名称集合，由请求入口设置为一个新的集合，用于判断是否发生过切换
+served_providers = contextvars.ContextVar("served_providers", default=None)
+
+
+class Provider:
+    """
+    一个 OpenAI 兼容的上游提供方，持有独立的连接池和失败统计
+    """
+
+    def __init__(self, name, provider_conf, pool_size=20, max_retries=1):
+        self.name = name
+        self.model = provider_conf["model"]
+
+        self.api_key = provider_conf["api_key"]
+        self.api_base = provider_conf["api_base"]
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+
+        # OpenRouter 需要附带站点信息
+        self.headers = {}
+        if provider_conf.get("site_url"):
+            self.headers["HTTP-Referer"] = provider_conf["site_url"]
+        if provider_conf.get("site_name"):
+            self.headers["X-Title"] = provider_conf["site_name"]
+
+        # openai 导入较慢，客户端在首次使用（或启动预热）时才创建
+        self._client = None
+        self._http_client = None
+
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def client(self):
+        """OpenAI 兼容的异步客户端，首次访问时创建"""
+        if self._client is None:
+            import httpx
+            import openai
+
+            self._http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.api_base,
+                default_headers=self.headers or None,
+                # 失败主要由路由切换提供方处理，客户端自身只做少量重试
+                max_retries=self.max_retries,
+                http_client=self._http_client,
+            )
+        return self._client
+
+    async def warmup(self, connections=2, timeout=10):
+        """
+        预先建立到上游的连接（DNS、TCP 与 TLS 握手），放入连接池供首批评审复用
+
+        只发送不带凭据的 HEAD 请求，任何 HTTP 响应都说明连接已建立；并发发送多个请求以建立多个连接。
+
+        Args:
+            connections: 预先建立的连接数
+            timeout: 单个请求的超时（秒）
+
+        Returns:
+            int: 成功建立的连接数
+        """
+        base_url = str(self.client.base_url)
+
+        async def ping():
+            await self._http_client.head(base_url, timeout=timeout)
+
+        results = await asyncio.gather(*(ping() for _ in range(connections)), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.warning("提供方 %s 连接预热失败: %s", self.name, errors[0])
+        return len(results) - len(errors)
+
+    def cooling_down(self):
+        return time.monotonic() < self.cooldown_until
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self, failure_threshold, cooldown_seconds):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= failure_threshold:
+            self.cooldown_until = time.monotonic() + cooldown_seconds
+            self.consecutive_failures = 0
+            logger.warning("提供方 %s 连续失败，暂停使用 %s 秒", self.name, cooldown_seconds)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+
+
+class ModelRouter:
+    """
+    多提供方路由
+
+    始终优先使用请求指定的提供方（use_claude 时为 openrouter），未指定时按配置顺序，用户不会在
+    不知情的情况下换用其他模型。只有该提供方处于暂停期、请求失败或首个 token 超时时才切换到
+    下一个提供方。已经开始输出的流不会中途切换。
+    """
+
+    def __init__(self, providers, ttft_timeout=60, failure_threshold=3, cooldown_seconds=60):
+        self.providers = providers
+        self.ttft_timeout = ttft_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+    def get(self, name):
+        for provider in self.providers:
+            if provider.name == name:
+                return provider
+        return None
+
+    def order(self, prefer=None):
+        """
+        返回本次调用尝试提供方的顺序
+
+        Args:
+            prefer: 优先使用的提供方名称，处于暂停期时不生效
+
+        Returns:
+            list: Provider 列表
+        """
+        def sort_key(item):
+            index, provider = item
+            return (provider.cooling_down(), provider.name != prefer, index)
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=sort_key)]
+
+    def primary(self, prefer=None):
+        """当前会被首先尝试的提供方"""
+        return self.order(prefer)[0]
+
+    async def _open(self, provider, messages, temperature, max_tokens, models):
+        response = await provider.client.chat.completions.create(
+            model=models.get(provider.name) or provider.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        iterator = response.__aiter__()
+        try:
+            # 首个增量常常只有 role，跳过不含内容的增量，首个 token 以第一个有内容的增量为准
+            while True:
+                first = await iterator.__anext__()
+                if first.choices and (
+                    first.choices[0].delta.content
+                    or getattr(first.choices[0].delta, "reasoning_content", None)
+                    or first.choices[0].finish_reason
+                ):
+                    break
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            # 首个 token 超时或出错时释放连接
+            await response.close()
+            raise
+        return response, iterator, first
+
+    async def stream(self, messages, temperature, max_tokens, prefer=None, models=None):
+        """
+        发起流式对话请求，逐个返回增量（choices[0].delta）
+
+        Args:
+            messages: 对话消息
+            temperature: 采样温度
+            max_tokens: 最大输出长度
+            prefer: 优先使用的提供方名称，默认读取 preferred_provider
+            models: 按提供方名称指定本次调用的模型（各评审阶段的配置），未指定时使用提供方的默认模型
+
+        Yields:
+            增量对象，包含 content / reasoning_content 等字段
+        """
+        import httpx
+        import openai
+
+        if prefer is None:
+            prefer = preferred_provider.get()
+        models = models or {}
+
+        last_error = None
+        for provider in self.order(prefer):
+            started = time.monotonic()
+            try:
+                response, iterator, first = await asyncio.wait_for(
+                    self._open(provider, messages, temperature, max_tokens, models),
+                    self.ttft_timeout,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"{provider.name} 首个 token 超时（{self.ttft_timeout} 秒）")
+                logger.warning("提供方 %s 调用失败，尝试切换: %s", provider.name, e)
+                metrics.llm_failures_total.inc(provider=provider.name, stage="open")
+                provider.record_failure(self.failure_threshold, self.cooldown_seconds)
+                last_error = e
+                continue
+
+            ttft = time.monotonic() - started
+            provider.record_success()
+            served = served_providers.get()
+            if served is not None:
+                served.add(provider.name)
+            metrics.llm_ttft_seconds.observe(ttft, provider=provider.name)
+            chunks = 0
+            try:
+                with metrics.llm_inflight.track():
+                    chunk = first
+                    while chunk is not None:
+                        if chunk.choices:
+                            chunks += 1
+                            yield chunk.choices[0].delta
+                        try:
+                            chunk = await iterator.__anext__()
+                        except StopAsyncIteration:
+                            chunk = None
+            except (openai.APIError, httpx.TransportError):
+                # 已经开始输出，不再切换，只记录失败供后续选择参考
+                metrics.llm_failures_total.inc(provider=provider.name, stage="stream")
+                provider.record_failure(self.failure_threshold, self.cooldown_seconds)
+                raise
+            finally:
+                await response.close()
+                elapsed = time.monotonic() - started
+                metrics.llm_stream_seconds.observe(elapsed, provider=provider.name)
+                metrics.llm_chunks_total.inc(chunks, provider=provider.name)
+                # 只统计首个 token 之后的输出速度
+                if chunks > 1 and elapsed > ttft:
+                    metrics.llm_chunks_per_second.observe((chunks - 1) / (elapsed - ttft), provider=provider.name)
+            return
+
+        raise last_error or RuntimeError("没有可用的模型提供方")
+
+    async def warmup(self, connections=2, timeout=10):
+        """
+        并发预热全部提供方的连接
+
+        Returns:
+            dict: 各提供方成功建立的连接数
+        """
+        counts = await asyncio.gather(*(provider.warmup(connections, timeout) for provider in self.providers))
+        return {provider.name: count for provider, count in zip(self.providers, counts)}
+
+    async def close(self):
+        for provider in self.providers:
+            await provider.close()
+
+
+def build_router():
+    """根据配置创建路由，提供方名称即配置中的顶层键（例如 model、openrouter）"""
+    providers = [
+        Provider(
+            name,
+            conf[name],
+            pool_size=router_conf.get("pool_size", 20),
+            max_retries=router_conf.get("max_retries", 1),
+        )
+        for name in router_conf.get("providers", ["model", "openrouter"])
+        if conf.get(name)
+    ]
+    return ModelRouter(
+        providers,
+        ttft_timeout=router_conf.get("ttft_timeout", 60),
+        failure_threshold=router_conf.get("failure_threshold", 3),
+        cooldown_seconds=router_conf.get("cooldown_seconds", 60),
+    )
+
+
+router = build_router()
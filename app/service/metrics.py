@@ -0,0 +1,243 @@
+import time
+import bisect
+import threading
+import contextlib
+
+# 默认的延迟分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 速率分桶（每秒页数 / 每秒增量数）
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+# 数量分桶（队列深度、单帧事件数等）
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# 文件大小分桶（字节）
+SIZE_BUCKETS = (64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextlib.contextmanager
+    def track(self, **labels):
+        """在上下文内将当前值加一，退出时减一"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """按分桶统计观测值的分布，同时记录总和与次数"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各分桶计数, 总和, 次数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """记录上下文的执行时间（秒）"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state[0][:], state[1], state[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    进程内的指标注册表，按 Prometheus 文本格式输出
+
+    多进程部署时每个 worker 各自统计，由抓取方按实例汇总。
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已存在")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        输出全部指标
+
+        Returns:
+            str: Prometheus 文本格式（version 0.0.4）
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# 上传
+upload_seconds = registry.histogram("review_upload_seconds", "上传文件耗时（秒）")
+upload_bytes = registry.histogram("review_upload_bytes", "上传文件大小（字节）", buckets=SIZE_BUCKETS)
+uploads_total = registry.counter("review_uploads_total", "上传请求数", ["status"])
+upload_dedup_total = registry.counter("review_upload_dedup_total", "内容已存在、未重复保存的上传数")
+upload_store_bytes = registry.gauge("review_upload_store_bytes", "上传存储占用的磁盘空间（字节），最近一次清理时统计")
+upload_store_files = registry.gauge("review_upload_store_files", "上传存储中的文件数，最近一次清理时统计")
+upload_sweep_deleted_total = registry.counter("review_upload_sweep_deleted_total", "清理删除的上传文件数", ["reason"])
+
+# PDF 文本提取
+extract_seconds = registry.histogram("review_extract_seconds", "PDF 文本提取耗时（秒）", ["cached"])
+extract_pages_total = registry.counter("review_extract_pages_total", "解析的 PDF 页数")
+extract_pages_per_second = registry.histogram("review_extract_pages_per_second", "PDF 解析速度（页/秒）", buckets=RATE_BUCKETS)
+extract_inflight = registry.gauge("review_extract_inflight", "正在进程池中执行的解析任务数")
+extract_workers = registry.gauge("review_extract_workers", "PDF 解析进程池大小")
+extract_engine_pages_total = registry.counter("review_extract_engine_pages_total", "各解析引擎提取的页数", ["engine"])
+extract_fallback_total = registry.counter("review_extract_fallback_total", "文档选定的引擎提取的文本为空或乱码、改用其他引擎的页段数", ["engine"])
+
+# 文本预处理
+preprocess_chars_total = registry.counter("review_preprocess_chars_total", "预处理前后的论文字符数", ["stage"])
+preprocess_tokens_total = registry.counter("review_preprocess_tokens_total", "预处理前后估算的论文 token 数", ["stage"])
+
+# 缓存
+cache_requests_total = registry.counter("review_cache_requests_total", "缓存查询次数", ["cache", "result"])
+
+# 上游模型调用
+llm_ttft_seconds = registry.histogram("review_llm_ttft_seconds", "上游首个 token 延迟（秒）", ["provider"])
+llm_stream_seconds = registry.histogram("review_llm_stream_seconds", "上游流式调用总耗时（秒）", ["provider"])
+llm_chunks_total = registry.counter("review_llm_chunks_total", "上游流式增量数（约等于输出 token 数）", ["provider"])
+llm_chunks_per_second = registry.histogram("review_llm_chunks_per_second", "单次流式调用的输出速度（增量/秒）", ["provider"], buckets=RATE_BUCKETS)
+llm_failures_total = registry.counter("review_llm_failures_total", "上游调用失败次数", ["provider", "stage"])
+llm_inflight = registry.gauge("review_llm_inflight", "进行中的上游流式调用数")
+llm_concurrency_limit = registry.gauge("review_llm_concurrency_limit", "上游流式调用并发上限")
+
+# 评审任务
+task_seconds = registry.histogram("review_task_seconds", "各处理任务耗时（秒）", ["task"])
+task_errors_total = registry.counter("review_task_errors_total", "各处理任务失败次数", ["task"])
+
+# 结果汇聚与 SSE 输出
+stream_queue_depth = registry.histogram("review_stream_queue_depth", "输出一批事件时汇聚队列中积压的事件数", buckets=COUNT_BUCKETS)
+stream_batch_events = registry.histogram("review_stream_batch_events", "每批输出合并的事件数", buckets=COUNT_BUCKETS)
+sse_write_seconds = registry.histogram("review_sse_write_seconds", "向客户端写出一批事件的耗时（秒），反映连接背压")
+
+# 准入控制
+admission_active = registry.gauge("review_admission_active", "已获准运行的评审数", ["kind"])
+admission_queued = registry.gauge("review_admission_queued", "排队等待的评审数", ["kind"])
+admission_wait_seconds = registry.histogram("review_admission_wait_seconds", "评审排队等待时间（秒）", ["kind"])
+admission_rejected_total = registry.counter("review_admission_rejected_total", "被拒绝的评审请求数", ["reason"])
+
+# 评审
+reviews_active = registry.gauge("review_active", "进行中的评审数")
+reviews_total = registry.counter("review_jobs_total", "结束的评审数", ["status"])
+review_seconds = registry.histogram("review_seconds", "评审总耗时（秒）", ["status"])
+
+# 启动
+startup_seconds = registry.gauge("review_startup_seconds", "启动各阶段耗时（秒）：import 为模块导入，warmup 为预热", ["phase"])
+ready = registry.gauge("review_ready", "是否已完成预热并就绪（1 / 0）")
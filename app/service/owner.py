@@ -0,0 +1,29 @@
+import os
+import socket
+
+# 当前进程的标识，记录在任务、批量评审和文件引用上，用于多进程部署时判断其所属进程是否仍在运行
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner):
+    """
+    判断记录所属的进程是否仍在运行
+
+    其他主机上的进程无法判断，视为仍在运行。
+    """
+    if not owner:
+        # 旧版本（单进程）创建的记录没有所属进程
+        return False
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    if int(pid) == os.getpid():
+        # 本进程运行的任务都登记在内存中，数据库里同号的记录只能来自已退出的旧进程
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
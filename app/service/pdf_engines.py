@@ -0,0 +1,296 @@
+import os
+import re
+import importlib.util
+import unicodedata
+
+from app.service.preprocess import CJK_CHAR_PATTERN
+from utils.log import get_logger
+
+logger = get_logger("app.service.pdf_engines")
+
+# pdfminer 对缺少编码映射的字形输出 (cid:123)
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+# 乱码的特征：UTF-8 按 Latin-1 / cp1252 解码产生的 Ã、Â 加续字节与 â€ 序列，C1 控制字符，
+# 以及缺少 ToUnicode 映射的中文字体解码出的连续 Latin-1 字母（如 Õâ¸öÎÄ）。
+# 单个带重音的字母和 ·、×、°、±、µ、§ 等符号是正常文本，不计入
+MOJIBAKE_PATTERN = re.compile("[\u00c2\u00c3][\u0080-\u00bf]|\u00e2\u20ac|[\u0080-\u009f]|[\u00c0-\u00ff]{3,}")
+# 替换字符、私用区字符
+INVALID_PATTERN = re.compile("[\ufffd\ue000-\uf8ff]")
+
+
+class PdfEngine:
+    """
+    PDF 文本提取引擎
+
+    各引擎依赖的库都是可选的，只在子进程中实际使用时才导入；未安装的引擎在选择时自动跳过。
+    """
+
+    name = ""
+    module = ""
+
+    def available(self):
+        """依赖的库是否已安装（不导入）"""
+        return importlib.util.find_spec(self.module) is not None
+
+    def load(self):
+        """导入依赖的库，用于预热解析进程"""
+        importlib.import_module(self.module)
+
+    def count_pages(self, pdf_path):
+        raise NotImplementedError
+
+    def extract_pages(self, pdf_path, start, end):
+        """
+        Returns:
+            list: [start, end) 各页的文本
+        """
+        raise NotImplementedError
+
+
+class PdfiumEngine(PdfEngine):
+    """pypdfium2（PDFium 的绑定），速度最快，对中文排版的支持较好"""
+
+    name = "pypdfium2"
+    module = "pypdfium2"
+
+    def count_pages(self, pdf_path):
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def extract_pages(self, pdf_path, start, end):
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            texts = []
+            for i in range(start, end):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                texts.append(textpage.get_text_range().replace("\r\n", "\n"))
+                textpage.close()
+                page.close()
+            return texts
+        finally:
+            pdf.close()
+
+
+class PypdfEngine(PdfEngine):
+    """pypdf，PyPDF2 的后续版本，纯 Python"""
+
+    name = "pypdf"
+    module = "pypdf"
+
+    def _reader(self, file):
+        import pypdf
+
+        return pypdf.PdfReader(file)
+
+    def count_pages(self, pdf_path):
+        with open(pdf_path, 'rb') as file:
+            return len(self._reader(file).pages)
+
+    def extract_pages(self, pdf_path, start, end):
+        with open(pdf_path, 'rb') as file:
+            reader = self._reader(file)
+            return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+class PyPDF2Engine(PypdfEngine):
+    """PyPDF2，最早使用的引擎，作为最后的备选"""
+
+    name = "PyPDF2"
+    module = "PyPDF2"
+
+    def _reader(self, file):
+        import PyPDF2
+
+        return PyPDF2.PdfReader(file)
+
+
+class PdfminerEngine(PdfEngine):
+    """pdfminer.six，按版面分析重组文本，较慢但能处理部分其他引擎无法解码的字体"""
+
+    name = "pdfminer"
+    module = "pdfminer"
+
+    def count_pages(self, pdf_path):
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdftypes import resolve1
+
+        with open(pdf_path, 'rb') as file:
+            document = PDFDocument(PDFParser(file))
+            return resolve1(document.catalog["Pages"])["Count"]
+
+    def extract_pages(self, pdf_path, start, end):
+        from io import StringIO
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        manager = PDFResourceManager(caching=True)
+        texts = []
+        with open(pdf_path, 'rb') as file:
+            for page in PDFPage.get_pages(file, pagenos=set(range(start, end))):
+                output = StringIO()
+                device = TextConverter(manager, output, laparams=LAParams())
+                PDFPageInterpreter(manager, device).process_page(page)
+                device.close()
+                texts.append(output.getvalue().rstrip("\f"))
+        return texts
+
+
+# 全部引擎，按名称索引
+ENGINES = {engine.name: engine for engine in (PdfiumEngine(), PypdfEngine(), PdfminerEngine(), PyPDF2Engine())}
+# 默认的尝试顺序，按速度从快到慢
+DEFAULT_ENGINES = ["pypdfium2", "pypdf", "pdfminer", "PyPDF2"]
+
+
+def candidate_engines(engine="auto", engines=None):
+    """
+    按尝试顺序返回已安装的引擎名称
+
+    Args:
+        engine: auto 或指定优先使用的引擎，其余引擎仍作为备选
+        engines: 自动选择时尝试的引擎及顺序
+
+    Returns:
+        list: 引擎名称列表
+    """
+    names = list(engines or DEFAULT_ENGINES)
+    if engine != "auto":
+        names = [engine] + [name for name in names if name != engine]
+    unknown = [name for name in names if name not in ENGINES]
+    if unknown:
+        logger.warning("未知的 PDF 解析引擎: %s", unknown)
+    names = [name for name in names if name in ENGINES and ENGINES[name].available()]
+    if not names:
+        raise RuntimeError("没有已安装的 PDF 解析引擎")
+    return names
+
+
+def text_quality(texts, min_chars_per_page=20):
+    """
+    估计提取文本的质量
+
+    以乱码字符（替换字符、私用区字符、(cid:N)、控制字符和 MOJIBAKE_PATTERN 匹配的乱码序列）
+    之外的字符比例为基础，每页平均字符数不足 min_chars_per_page 时按比例降低。
+
+    Args:
+        texts: 各页文本
+        min_chars_per_page: 每页的最少字符数
+
+    Returns:
+        float: 0 到 1 之间的分数，0 表示没有提取到文本
+    """
+    text = "".join(texts)
+    text = re.sub(r"\s+", "", text)
+    if not text or not texts:
+        return 0.0
+    bad = (
+        len(INVALID_PATTERN.findall(text))
+        + sum(len(match) for match in CID_PATTERN.findall(text))
+        + sum(len(match) for match in MOJIBAKE_PATTERN.findall(text))
+        + sum(1 for char in text if unicodedata.category(char) == "Cc" and not "\u0080" <= char <= "\u009f")
+    )
+    clean = max(0.0, 1 - bad / len(text))
+    return clean * min(1.0, len(text) / len(texts) / max(1, min_chars_per_page))
+
+
+def cjk_ratio(texts):
+    """中文字符占非空白字符的比例"""
+    text = re.sub(r"\s+", "", "".join(texts))
+    return len(CJK_CHAR_PATTERN.findall(text)) / len(text) if text else 0.0
+
+
+def _try_extract(name, pdf_path, start, end, min_chars_per_page):
+    try:
+        texts = ENGINES[name].extract_pages(pdf_path, start, end)
+    except Exception as e:
+        logger.warning("%s 提取第 %s-%s 页失败: %s", name, start + 1, end, e)
+        return None, -1.0
+    return texts, text_quality(texts, min_chars_per_page)
+
+
+def select_engine(pdf_path, engines, probe_pages=3, min_quality=0.8, min_chars_per_page=20):
+    """
+    为文档选择引擎（在解析子进程中执行）
+
+    按顺序用各引擎试提取开头的 probe_pages 页，选择第一个质量达到 min_quality 的引擎；
+    都不达标时选择质量最高的引擎。
+
+    Args:
+        pdf_path: PDF 文件路径
+        engines: candidate_engines 返回的引擎名称列表
+        probe_pages: 试提取的页数
+        min_quality: 质量下限
+        min_chars_per_page: 每页的最少字符数
+
+    Returns:
+        tuple: (引擎名称, 总页数, 试提取的各页文本)
+
+    Raises:
+        ValueError: 所有引擎都无法读取该文件
+    """
+    best = None
+    last_error = None
+    for name in engines:
+        try:
+            num_pages = ENGINES[name].count_pages(pdf_path)
+        except Exception as e:
+            logger.warning("%s 无法读取 PDF: %s", name, e)
+            last_error = e
+            continue
+        texts, score = _try_extract(name, pdf_path, 0, min(num_pages, probe_pages), min_chars_per_page)
+        if texts is None:
+            continue
+        if score >= min_quality:
+            return name, num_pages, texts
+        if best is None or score > best[0]:
+            best = (score, name, num_pages, texts)
+    if best is None:
+        raise ValueError(f"无法解析 PDF 文件: {last_error}")
+    return best[1:]
+
+
+def extract_range(pdf_path, start, end, engines, min_quality=0.8, min_chars_per_page=20, max_fallbacks=1):
+    """
+    提取 [start, end) 页的文本（在解析子进程中执行）
+
+    使用 engines 中的第一个引擎（文档选定的引擎），文本过少或乱码时依次换用其余引擎（最多
+    max_fallbacks 个），保留质量最高的结果。选定的引擎没有提取到任何文本时视为这些页没有
+    文本层（图片、空白页），不再尝试其他引擎。
+
+    Returns:
+        tuple: (各页文本, 实际使用的引擎名称)
+    """
+    best_texts, best_score, used = None, -1.0, engines[0]
+    for i, name in enumerate(engines[:1 + max(0, max_fallbacks)]):
+        texts, score = _try_extract(name, pdf_path, start, end, min_chars_per_page)
+        if score > best_score:
+            best_texts, best_score, used = texts, score, name
+        if best_score >= min_quality:
+            break
+        if i == 0 and texts is not None and not any(text.strip() for text in texts):
+            break
+    if best_texts is None:
+        raise ValueError(f"无法提取第 {start + 1}-{end} 页的文本")
+    return best_texts, used
+
+
+def warm(engines):
+    """
+    在解析子进程中预先导入各引擎的库
+
+    Returns:
+        int: 子进程 ID，用于统计已启动的进程数
+    """
+    for name in engines:
+        ENGINES[name].load()
+    return os.getpid()
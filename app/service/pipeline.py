@@ -0,0 +1,228 @@
+import os
+import json
+import asyncio
+import hashlib
+
+from app.service import metrics
+from app.service.extractors import extract_pdf_text
+from app.service.cache import file_sha256, result_cache, result_cache_key
+from app.service.streaming import FanIn, coalesce
+from app.service.chunking import chunk_paper
+from app.service.preprocess import preprocess_pages
+from app.service.llm import preferred_provider, served_providers
+from app.service.reviewers import process_panel_task, max_reviewers
+from app.service.processors import process_json_task, process_reasoning_task, process_content_task, process_review_task, process_map_task, review_fingerprint
+from utils.get_prompt import get_markdown_prompt
+from utils.conf import get_conf
+from utils.log import get_logger
+
+logger = get_logger("app.service.pipeline")
+
+
+async def review_pipeline(file_path, page_limit=0, num_reviewers=1, use_claude=False, file_hash=None):
+    """
+    完整的论文评审流程：提取文本、（长论文）分段分析、评审与结构化输出
+
+    Args:
+        file_path: PDF 文件路径
+        page_limit: 页数限制，0表示不限制
+        num_reviewers: 评审人数量
+        use_claude: 是否优先使用 Claude（OpenRouter）
+        file_hash: 文件内容哈希（上传存储按内容哈希保存文件，加引用时已经得到），为空时读取文件计算
+
+    Yields:
+        str: 一个或多个 SSE 帧，最后一帧为 complete 或 error
+    """
+    # 每次评审读取当前配置（内存缓存，配置文件修改后自动更新）
+    conf = get_conf()
+    # 本次评审的结果汇聚，流程被取消时需要取消其中的任务
+    fan_in = None
+    # use_claude 时优先使用 OpenRouter，失败时仍可切换回默认提供方
+    preferred_provider.set("openrouter" if use_claude else None)
+    # 记录实际输出结果的提供方，发生切换时结果不写入缓存
+    served = set()
+    served_providers.set(served)
+    try:
+        # 获取PDF文件名
+        pdf_name = os.path.basename(file_path)
+        logger.debug("开始处理PDF: %s", pdf_name)
+        
+        try:
+            # 文件内容哈希用于文本缓存和结果缓存的键，调用方未提供时才读取整个文件计算（在线程中执行）
+            if file_hash is None:
+                file_hash = await asyncio.get_running_loop().run_in_executor(
+                    None, file_sha256, file_path
+                )
+
+            # 第一阶段：提取PDF文本（命中缓存时跳过解析），直接流式返回进度
+            text_gen = extract_pdf_text(file_path, page_limit, file_hash)
+            # 迭代所有消息
+            all_text = ""
+            pages = []
+            cache_hit = False
+            async for message in text_gen:
+                # 检查是否是文本内容消息
+                if message.startswith('data:'):
+                    # 直接传递进度消息给前端
+                    yield message
+                else:
+                    # 解析JSON获取文本内容或错误
+                    result = json.loads(message)
+                    if result["type"] == "extracted_text":
+                        all_text = result["text"]
+                        pages = result.get("pages") or [all_text]
+                        cache_hit = result.get("cached", False)
+                    elif result["type"] == "error":
+                        # 如果是错误，转换为SSE格式并传递给前端
+                        error_msg = {
+                            "type": "error",
+                            "message": result["message"]
+                        }
+                        yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
+                        return
+            
+            if not all_text or not all_text.strip():
+                raise Exception("PDF内容提取为空")
+            
+            logger.debug("PDF文本提取完成，长度: %s，命中缓存: %s", len(all_text), cache_hit)
+
+            # 第二阶段：删除页眉页脚、截断参考文献、规范化空白，减少每次模型调用的输入 token
+            preprocess_conf = conf.get("preprocess", {})
+            if preprocess_conf.get("enabled", True):
+                all_text, stats = await asyncio.get_running_loop().run_in_executor(
+                    None, preprocess_pages, pages, preprocess_conf
+                )
+                logger.info(
+                    "文本预处理: %s → %s 字符，约 %s → %s tokens",
+                    stats["chars_before"], stats["chars_after"], stats["tokens_before"], stats["tokens_after"],
+                )
+                for stage in ("before", "after"):
+                    metrics.preprocess_chars_total.inc(stats[f"chars_{stage}"], stage=stage)
+                    metrics.preprocess_tokens_total.inc(stats[f"tokens_{stage}"], stage=stage)
+                preprocess_msg = {
+                    "type": "preprocess",
+                    **stats,
+                    "message": f"文本预处理完成，约 {stats['tokens_before']} → {stats['tokens_after']} tokens"
+                }
+                yield f"data: {json.dumps(preprocess_msg, ensure_ascii=False)}\n\n"
+            
+            prompt = get_markdown_prompt()
+
+            # 是否使用单次调用模式（推理与内容共用一次模型调用）
+            single_call = conf.get("review", {}).get("single_call", True)
+
+            # 评审人数量，超过上限时按上限处理
+            num_reviewers = max(1, min(num_reviewers, max_reviewers()))
+
+            # 长论文使用分段分析（map）+ 整体评审（reduce）
+            map_conf = conf.get("map_reduce", {})
+            use_map_reduce = map_conf.get("enabled", True) and len(all_text) > map_conf.get("threshold_chars", 60000)
+            chunk_chars = map_conf.get("chunk_chars", 20000)
+
+            # 相同论文文本、提示词、模型和参数的评审结果直接回放
+            result_key = None
+            fingerprint = review_fingerprint()
+            if result_cache is not None:
+                result_key = result_cache_key(
+                    text_hash=hashlib.sha256(all_text.encode("utf-8")).hexdigest(),
+                    page_limit=page_limit,
+                    single_call=single_call,
+                    num_reviewers=num_reviewers,
+                    map_reduce=chunk_chars if use_map_reduce else 0,
+                    **fingerprint,
+                )
+                # 缓存读写与淘汰涉及文件读写和目录遍历，在线程中执行，不阻塞事件循环
+                cached_frames = await asyncio.get_running_loop().run_in_executor(None, result_cache.get, result_key)
+                metrics.cache_requests_total.inc(cache="result", result="miss" if cached_frames is None else "hit")
+                if cached_frames is not None:
+                    logger.debug("命中评审结果缓存: %s", result_key)
+                    cache_msg = {
+                        "type": "progress",
+                        "current": 1,
+                        "total": 1,
+                        "message": "命中评审结果缓存，正在回放",
+                        "cached": True
+                    }
+                    yield f"data: {json.dumps(cache_msg, ensure_ascii=False)}\n\n"
+                    yield "".join(cached_frames)
+                    return
+
+            recorded_frames = []
+            stream_conf = conf.get("stream", {})
+            review_text = all_text
+
+            if use_map_reduce:
+                # map 阶段：并发分析各分段，进度事件直接返回给前端
+                chunks = chunk_paper(all_text, chunk_chars)
+                logger.debug("论文较长（%s 字符），分为 %s 段进行分析", len(all_text), len(chunks))
+                fan_in = FanIn()
+                map_task = fan_in.spawn("分段分析任务", process_map_task(
+                    chunks,
+                    fan_in.queue,
+                    concurrency=map_conf.get("concurrency", 4),
+                ))
+                async for frames in coalesce(fan_in):
+                    recorded_frames.append(frames)
+                    yield frames
+                if fan_in.errors or not map_task.result():
+                    return
+                review_text = map_task.result()
+
+            # 汇聚各生产者任务的输出，全部生产者结束后立即结束迭代
+            fan_in = FanIn()
+            result_queue = fan_in.queue
+            if num_reviewers > 1:
+                # 多评审人：事件带 reviewer 编号，最后输出合并后的 JSON 结构
+                fan_in.spawn("多评审人任务", process_panel_task(review_text, result_queue, prompt, num_reviewers))
+            else:
+                if single_call:
+                    fan_in.spawn("评审任务", process_review_task(review_text, result_queue, prompt))
+                else:
+                    fan_in.spawn("推理任务", process_reasoning_task(review_text, result_queue, prompt))
+                    fan_in.spawn("内容任务", process_content_task(review_text, result_queue, prompt))
+                fan_in.spawn("JSON任务", process_json_task(review_text, result_queue))
+
+            # 开始实时处理结果流，合并细粒度增量后再写给客户端，同时记录用于结果缓存
+            async for frames in coalesce(
+                fan_in,
+                window_ms=stream_conf.get("coalesce_ms", 30),
+                max_bytes=stream_conf.get("coalesce_bytes", 4096),
+            ):
+                recorded_frames.append(frames)
+                yield frames
+            
+            # 发送完成消息
+            complete_msg = {
+                "type": "complete",
+                "message": "评审完成"
+            }
+            complete_frame = f"data: {json.dumps(complete_msg, ensure_ascii=False)}\n\n"
+            recorded_frames.append(complete_frame)
+            yield complete_frame
+
+            # 只缓存没有出错、且全部由键中的提供方输出的完整评审；切换过提供方的结果不能记在首选模型名下
+            if result_key is not None and fan_in.errors == 0:
+                if served == {fingerprint["provider"]}:
+                    await asyncio.get_running_loop().run_in_executor(None, result_cache.put, result_key, recorded_frames)
+                else:
+                    logger.info("评审过程中切换了提供方（%s），结果不写入缓存", sorted(served))
+            
+        except Exception as e:
+            logger.exception("处理异常: %s", e)
+            error_msg = {
+                "type": "error",
+                "message": str(e)
+            }
+            yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
+            
+    except Exception as e:
+        logger.exception("流处理异常: %s", e)
+        error_msg = {
+            "type": "error",
+            "message": str(e)
+        }
+        yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
+    finally:
+        # 取消尚未完成的评审任务（例如评审任务被取消）
+        if fan_in is not None:
+            fan_in.cancel()
@@ -0,0 +1,209 @@
+import re
+from collections import Counter
+
+from app.service.chunking import CHINESE_HEADING, MAX_HEADING_CHARS
+
+# 页码行：“12”、“- 12 -”、“第 12 页”、“第12页 共30页”、“Page 12 of 30”、罗马数字等
+# 罗马数字页码（前言、目录等）：只匹配 1-399 的合法写法，并且全部小写或全部大写，
+# 避免把 mix、civil、dim、cm 之类的单词当作页码
+_ROMAN_LOWER = r"(?=[ivxlc])c{0,3}(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})"
+_ROMAN_UPPER = _ROMAN_LOWER.upper()
+PAGE_NUMBER_PATTERN = re.compile(
+    r"^\s*("
+    r"[-—–·\s]*\d{1,4}[-—–·\s]*"
+    r"|第\s*\d{1,4}\s*页(\s*[,，/]?\s*共\s*\d{1,4}\s*页)?"
+    r"|\d{1,4}\s*/\s*\d{1,4}"
+    r"|(?i:page)\s*\d{1,4}(\s*(?i:of)\s*\d{1,4})?"
+    r"|" + _ROMAN_LOWER +
+    r"|" + _ROMAN_UPPER +
+    r")\s*$"
+)
+
+# 参考文献标题
+REFERENCES_PATTERN = re.compile(r"^\s*(参\s*考\s*文\s*献|references|bibliography)\s*[:：]?\s*$", re.IGNORECASE)
+# 参考文献之后的其他部分（下一章节、致谢、附录等）的标题；申请书中参考文献常位于正文中间。
+# 不使用阿拉伯数字编号的标题，以免与“1. 作者”形式的文献条目混淆
+AFTER_REFERENCES_PATTERN = re.compile(
+    r"^\s*("
+    + CHINESE_HEADING +
+    r"|致\s*谢|附\s*录|后\s*记|appendix|acknowledge?ments?|攻读.{0,20}期间"
+    r")",
+    re.IGNORECASE,
+)
+# 单条参考文献的开头：[1]、［1］、1.、(1) 等
+REFERENCE_ENTRY_PATTERN = re.compile(r"^\s*([\[［【(（]\s*\d{1,4}\s*[\]］】)）]|\d{1,4}[.．、](\s|$))")
+
+# 中文字符与全角标点
+CJK = "\u3000-\u303f\u4e00-\u9fff\uff00-\uffef"
+CJK_CHAR_PATTERN = re.compile(f"[{CJK}]")
+# PDF 提取时常在中文字符之间插入空格
+CJK_SPACE_PATTERN = re.compile(f"(?<=[{CJK}])[ \\t]+(?=[{CJK}])")
+# 英文单词在行尾被连字符断开
+HYPHENATION_PATTERN = re.compile(r"([A-Za-z])-\n\s*([a-z])")
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数
+
+    按常见分词器的经验值：一个中文字符约 0.6 个 token，其他字符约 0.3 个 token。
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的 token 数
+    """
+    cjk = len(CJK_CHAR_PATTERN.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3)
+
+
+def _line_key(line):
+    # 页眉页脚中的页码、日期等数字每页不同，比较时统一替换
+    return re.sub(r"\d+", "#", re.sub(r"\s+", "", line))
+
+
+def strip_headers_footers(pages, edge_lines=3, min_ratio=0.5, page_numbers=True):
+    """
+    删除每页开头和结尾重复出现的页眉、页脚及页码行
+
+    只检查每页开头和结尾的 edge_lines 个非空行；同一内容（忽略数字和空白）出现在至少
+    min_ratio 比例的页面中时视为页眉或页脚。
+
+    Args:
+        pages: 每页文本列表
+        edge_lines: 每页开头和结尾检查的行数
+        min_ratio: 判定为重复内容的最少页面比例
+        page_numbers: 是否删除单独成行的页码
+
+    Returns:
+        tuple: (处理后的每页文本列表, 删除的行数)
+    """
+    page_lines = [page.splitlines() for page in pages]
+
+    def edges(lines):
+        indexes = [i for i, line in enumerate(lines) if line.strip()]
+        return set(indexes[:edge_lines] + indexes[-edge_lines:])
+
+    repeated = set()
+    # 页数太少时无法区分重复的页眉和正文
+    if len(pages) >= 3:
+        counts = Counter()
+        for lines in page_lines:
+            counts.update({_line_key(lines[i]) for i in edges(lines)})
+        threshold = max(2, min_ratio * len(pages))
+        repeated = {key for key, count in counts.items() if count >= threshold}
+
+    removed = 0
+    result = []
+    for lines in page_lines:
+        drop = {
+            i for i in edges(lines)
+            if _line_key(lines[i]) in repeated or (page_numbers and PAGE_NUMBER_PATTERN.match(lines[i]))
+        }
+        removed += len(drop)
+        result.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return result, removed
+
+
+def truncate_references(text, mode="truncate", keep_chars=1500):
+    """
+    截断或删除参考文献部分
+
+    从最后一个参考文献标题开始，直到下一个章节、致谢、附录等标题（或全文结束）为止视为参考文献；
+    其中识别出的文献条目少于 3 条时（例如只是目录中的标题）不做处理。
+
+    Args:
+        text: 论文全文
+        mode: keep 保留，truncate 只保留前 keep_chars 个字符，drop 删除
+        keep_chars: truncate 时保留的字符数
+
+    Returns:
+        tuple: (处理后的文本, 删除的字符数)
+    """
+    if mode not in ("truncate", "drop"):
+        return text, 0
+    lines = text.split("\n")
+    start = next((i for i in range(len(lines) - 1, -1, -1) if REFERENCES_PATTERN.match(lines[i])), None)
+    if start is None:
+        return text, 0
+
+    end = next(
+        (i for i in range(start + 1, len(lines)) if AFTER_REFERENCES_PATTERN.match(lines[i]) and len(lines[i].strip()) <= MAX_HEADING_CHARS),
+        len(lines),
+    )
+    body = "\n".join(lines[start + 1:end])
+    entries = sum(1 for line in lines[start + 1:end] if REFERENCE_ENTRY_PATTERN.match(line))
+    if entries < 3:
+        return text, 0
+    if mode == "drop":
+        kept = ""
+    else:
+        if len(body) <= keep_chars:
+            return text, 0
+        # 在条目边界处截断
+        kept = body[:keep_chars]
+        kept = kept[:kept.rfind("\n")] if "\n" in kept else kept
+    note = f"（参考文献共 {entries} 条，其余部分已省略）"
+    replaced = [lines[start], *([kept] if kept else []), note]
+    new_text = "\n".join(lines[:start] + replaced + lines[end:])
+    return new_text, max(0, len(text) - len(new_text))
+
+
+def normalize_whitespace(text, dehyphenate=True):
+    """
+    规范化空白：合并连续空格、删除中文字符之间的空格和行尾空白，最多保留一个空行
+
+    Args:
+        text: 文本
+        dehyphenate: 是否合并行尾被连字符断开的英文单词
+
+    Returns:
+        str: 处理后的文本
+    """
+    if dehyphenate:
+        text = HYPHENATION_PATTERN.sub(r"\1\2", text)
+    text = text.replace("\u00a0", " ").replace("\r", "")
+    text = re.sub("[ \t\u3000]+", " ", text)
+    text = CJK_SPACE_PATTERN.sub("", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def preprocess_pages(pages, options=None):
+    """
+    在发送给模型之前精简论文文本，减少输入 token
+
+    依次删除重复的页眉页脚和页码、截断参考文献、规范化空白。
+
+    Args:
+        pages: 每页文本列表
+        options: 配置中的 preprocess 块
+
+    Returns:
+        tuple: (处理后的全文, 统计信息字典)
+    """
+    options = options or {}
+    original = "\n\n".join(pages)
+    stats = {"chars_before": len(original), "tokens_before": estimate_tokens(original), "header_footer_lines": 0}
+
+    if options.get("header_footer", True):
+        pages, stats["header_footer_lines"] = strip_headers_footers(
+            pages,
+            edge_lines=options.get("header_footer_lines", 3),
+            min_ratio=options.get("header_footer_min_ratio", 0.5),
+            page_numbers=options.get("page_numbers", True),
+        )
+    text = "\n\n".join(pages)
+    text, stats["reference_chars"] = truncate_references(
+        text,
+        mode=options.get("references", "truncate"),
+        keep_chars=options.get("references_keep_chars", 1500),
+    )
+    if options.get("whitespace", True):
+        text = normalize_whitespace(text, dehyphenate=options.get("dehyphenate", True))
+
+    stats["chars_after"] = len(text)
+    stats["tokens_after"] = estimate_tokens(text)
+    return text, stats
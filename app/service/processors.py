@@ -1,102 +1,156 @@
 import json
+import time
 import asyncio
-import openai
-from utils.get_prompt import get_json_prompt
+import hashlib
+from app.service import metrics
+from app.service.llm import router, preferred_provider
+from app.service.json_stream import IncrementalJSONParser, validate_field
+from utils.get_prompt import get_json_prompt, get_prompts_hash
 from utils.conf import get_conf
+from utils.log import get_logger
 
 # 获取配置
 conf = get_conf()
+logger = get_logger("app.service.processors")
 
-# 创建 OpenAI 客户端
-client = openai.OpenAI(
-  api_key=conf["model"]["api_key"],
-  base_url=conf["model"]["api_base"]
-)
+# 全局上游并发限制：同一进程内同时进行的模型流式调用数量
+llm_semaphore = asyncio.Semaphore(conf.get("review", {}).get("max_concurrency", 32))
+metrics.llm_concurrency_limit.set(conf.get("review", {}).get("max_concurrency", 32))
+
+# 评审使用的默认采样参数（模型由 router 按提供方配置选择），可由配置中的 stages 块按阶段覆盖
+REVIEW_TEMPERATURE = 0.6
+JSON_TEMPERATURE = 0.5
+STAGE_DEFAULTS = {
+    "reasoning": {"temperature": REVIEW_TEMPERATURE, "max_tokens": 10000},
+    "content": {"temperature": REVIEW_TEMPERATURE, "max_tokens": 10000},
+    "json": {"temperature": JSON_TEMPERATURE, "max_tokens": 10000},
+    "map": {"temperature": REVIEW_TEMPERATURE, "max_tokens": 2000},
+}
+
+# 各任务所属的阶段：单次调用模式同时输出推理与内容，需要推理模型，归入 reasoning 阶段
+TASK_STAGES = {"review": "reasoning", "reasoning": "reasoning", "content": "content"}
+
+# 各评审任务的系统提示词
+SYSTEM_PROMPTS = {
+    "review": "你是一个专业的论文评审专家，请先充分思考和推理，再输出完整的评审内容，对以下论文进行评审：",
+    "reasoning": "你是一个专业的论文评审专家，请专注于思考和推理过程，对以下论文进行评审：",
+    "content": "你是一个专业的论文评审专家，请专注于评审内容的输出，对以下论文进行评审：",
+    "map": "你是一个专业的论文评审专家。下面是一篇较长论文的其中一部分，请简明提炼这一部分的研究问题、方法、数据、主要结论、创新点和明显不足，保留关键原文表述，供后续整体评审使用：",
+}
+
+# 分段分析结果拼接后，作为整体评审输入的说明
+MAP_REDUCE_PREFIX = "（论文原文较长，以下为按章节分段提炼的分析摘要，请基于这些摘要对整篇论文进行评审）\n\n"
+
+# 系统提示词在代码中固定，哈希只需计算一次
+SYSTEM_PROMPTS_HASH = hashlib.sha256(
+    json.dumps([MAP_REDUCE_PREFIX, SYSTEM_PROMPTS], ensure_ascii=False, sort_keys=True).encode("utf-8")
+).hexdigest()
+
+def stage_options(stage):
+    """
+    读取评审阶段的模型与采样参数（每次读取当前配置，配置文件修改后自动生效）
+
+    Args:
+        stage: 阶段名称，reasoning / content / json / map
+
+    Returns:
+        dict: temperature、max_tokens，以及按提供方名称指定模型的 models
+    """
+    options = {**STAGE_DEFAULTS[stage], "models": {}}
+    options.update(get_conf().get("stages", {}).get(stage) or {})
+    options["models"] = options["models"] or {}
+    return options
+
+def review_fingerprint():
+    """
+    返回影响评审输出的参数，用于构造评审结果缓存的键
+
+    Returns:
+        dict: 包含各阶段的模型与采样参数和提示词哈希（提示词文件修改后随之变化）
+    """
+    primary = router.primary(preferred_provider.get())
+    stages = {}
+    for stage in STAGE_DEFAULTS:
+        options = stage_options(stage)
+        stages[stage] = [options["models"].get(primary.name) or primary.model, options["temperature"], options["max_tokens"]]
+    return {
+        "provider": primary.name,
+        "stages": stages,
+        "prompt_hash": get_prompts_hash(),
+        "system_prompt_hash": SYSTEM_PROMPTS_HASH,
+    }
+
+async def close_client():
+    """关闭各提供方的连接池"""
+    await router.close()
 
 # 统一处理任务的辅助函数
-async def process_task(task_type, paper_text, result_queue, markdown_prompt, system_prompt):
+async def process_task(task_type, paper_text, result_queue, markdown_prompt, system_prompt, temperature=None, tags=None):
     """
     统一处理AI评审任务
     
     Args:
         task_type: 任务类型
         paper_text: 论文文本内容
-        result_queue: 结果队列
+        result_queue: 结果队列，放入事件字典，由 streaming 层合并并编码为 SSE 帧
         markdown_prompt: Markdown格式要求
         system_prompt: 系统提示词
+        temperature: 采样温度，默认使用任务所属阶段的配置
+        tags: 附加到每个事件上的字段（例如评审人编号）
     """
+    tags = tags or {}
+    options = stage_options(TASK_STAGES[task_type])
+    started = time.monotonic()
     try:
         # 构建系统提示词，添加 Markdown 格式要求
         if markdown_prompt:
             system_prompt = f"你的角色是:\n\n{system_prompt},你的输出格式需要遵循以下要求：{markdown_prompt}"
 
-        print(f"[DEBUG] 开始处理{task_type}任务")
-        
-        # 创建请求
-        response = client.chat.completions.create(
-            model="deepseek-r1-250120",
-            messages=[
-                {"role": "system", "content": system_prompt + paper_text},
-            ],
-            temperature=0.6,
-            max_tokens=10000,
-            stream=True
-        )
-        
+        logger.debug("开始处理%s任务", task_type)
         
-        
-        if task_type == "content":
-            # 处理响应
-            for chunk in response:
-                if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                 
-                
-                    data = {
-                        "type": "content",
-                        "content": content
-                    }
-                    await result_queue.put(f"data: {json.dumps(data, ensure_ascii=False)}\n\n")
-                  
-                    await asyncio.sleep(0.0005)
-               # 输出完整JSON结构
-            # content_result = {
-            #     "type": "content_complete",
-            #     "content_complete": "论文评审完成"
-            # }
-            # await result_queue.put(f"data: {json.dumps(content_result, ensure_ascii=False)}\n\n")  
-          
-        elif task_type == "reasoning":
-            # 处理响应
-            for chunk in response:
-                if hasattr(chunk.choices[0].delta, 'reasoning_content') and chunk.choices[0].delta.reasoning_content:
-                    content = chunk.choices[0].delta.reasoning_content
-                  
-                    data = {
-                        "type": "reasoning",
-                        "reasoning": content
-                    }
-                    await result_queue.put(f"data: {json.dumps(data, ensure_ascii=False)}\n\n")
-                    # 更小的sleep时间，减少延迟
-                    await asyncio.sleep(0.0005)
-            # # 输出完整JSON结构
-            # reasoning_result = {
-            #     "type": "reasoning_complete",
-            #     "reasoning_complete": "论文评审完成"
-            # }
-            # await result_queue.put(f"data: {json.dumps(reasoning_result, ensure_ascii=False)}\n\n")  
-            
-
-            print(f"[DEBUG] {task_type}任务完成")
+        # 受全局并发限制，等待空闲的上游调用名额
+        async with llm_semaphore:
+            # 创建请求，处理响应，按任务类型转发 reasoning_content / content 增量
+            async for delta in router.stream(
+                messages=[
+                    {"role": "system", "content": system_prompt + paper_text},
+                ],
+                temperature=options["temperature"] if temperature is None else temperature,
+                max_tokens=options["max_tokens"],
+                models=options["models"],
+            ):
+                if task_type in ("review", "reasoning"):
+                    reasoning = getattr(delta, 'reasoning_content', None)
+                    if reasoning:
+                        data = {
+                            "type": "reasoning",
+                            "reasoning": reasoning,
+                            **tags
+                        }
+                        await result_queue.put(data)
+
+                if task_type in ("review", "content"):
+                    content = getattr(delta, 'content', None)
+                    if content:
+                        data = {
+                            "type": "content",
+                            "content": content,
+                            **tags
+                        }
+                        await result_queue.put(data)
+
+        logger.debug("%s任务完成", task_type)
     except Exception as e:
-        import traceback
-        print(f"[ERROR] {task_type}处理异常: {str(e)}")
-        print(f"[ERROR] {task_type}处理异常堆栈: {traceback.format_exc()}")
+        metrics.task_errors_total.inc(task=task_type)
+        logger.exception("%s处理异常: %s", task_type, e)
         error_msg = {
             "type": "error",
-            "message": str(e)
+            "message": str(e),
+            **tags
         }
-        await result_queue.put(f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n")
+        await result_queue.put(error_msg)
+    finally:
+        metrics.task_seconds.observe(time.monotonic() - started, task=task_type)
 
 # 专门处理推理过程的函数
 async def process_reasoning_task(paper_text, result_queue, markdown_prompt=None):
@@ -108,7 +162,7 @@ async def process_reasoning_task(paper_text, result_queue, markdown_prompt=None)
         result_queue: 结果队列
         markdown_prompt: Markdown格式要求
     """
-    system_prompt = "你是一个专业的论文评审专家，请专注于思考和推理过程，对以下论文进行评审："
+    system_prompt = SYSTEM_PROMPTS["reasoning"]
     await process_task("reasoning", paper_text, result_queue, markdown_prompt, system_prompt)
 
 # 专门处理评审内容的函数
@@ -121,74 +175,179 @@ async def process_content_task(paper_text, result_queue, markdown_prompt=None):
         result_queue: 结果队列
         markdown_prompt: Markdown格式要求
     """
-    system_prompt = "你是一个专业的论文评审专家，请专注于评审内容的输出，对以下论文进行评审："
+    system_prompt = SYSTEM_PROMPTS["content"]
     await process_task("content", paper_text, result_queue, markdown_prompt, system_prompt)
 
+# 单次调用同时输出推理过程与评审内容的函数
+async def process_review_task(paper_text, result_queue, markdown_prompt=None, persona=None, temperature=None, tags=None):
+    """
+    处理论文评审任务（单次调用模式）
+
+    只发起一次流式请求，将 reasoning_content 与 content 分别转发为
+    reasoning 和 content 事件，避免为同一篇论文重复生成两次。
+
+    Args:
+        paper_text: 论文文本内容
+        result_queue: 结果队列
+        markdown_prompt: Markdown格式要求
+        persona: 评审人角色描述，为空时使用默认角色
+        temperature: 采样温度
+        tags: 附加到每个事件上的字段
+    """
+    system_prompt = SYSTEM_PROMPTS["review"]
+    if persona:
+        system_prompt = f"你是{persona}。{system_prompt}"
+    await process_task("review", paper_text, result_queue, markdown_prompt, system_prompt, temperature, tags)
+
+# 长论文分段分析（map 阶段）
+async def process_map_task(chunks, result_queue, concurrency=4):
+    """
+    并发分析论文的各个分段，返回按原文顺序拼接的分段摘要
+
+    Args:
+        chunks: 分段文本列表
+        result_queue: 结果队列，每完成一个分段放入一条进度事件
+        concurrency: 本次评审同时分析的分段数上限
+
+    Returns:
+        str: 作为整体评审（reduce 阶段）输入的分段摘要文本
+    """
+    total = len(chunks)
+    notes = [None] * total
+    done = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    # 所有分段使用同一份配置，与结果缓存键中记录的 map 阶段参数一致
+    options = stage_options("map")
+
+    async def analyze(index, chunk_text):
+        nonlocal done
+        # 先占用本次评审的名额，再等待全局上游名额
+        async with semaphore, llm_semaphore:
+            parts = []
+            async for delta in router.stream(
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPTS["map"]},
+                    {"role": "user", "content": f"第 {index + 1}/{total} 部分：\n\n{chunk_text}"}
+                ],
+                temperature=options["temperature"],
+                max_tokens=options["max_tokens"],
+                models=options["models"],
+            ):
+                content = getattr(delta, 'content', None)
+                if content:
+                    parts.append(content)
+
+        notes[index] = "".join(parts)
+        done += 1
+        await result_queue.put({
+            "type": "progress",
+            "current": done,
+            "total": total,
+            "message": f"正在分段分析论文 {done}/{total}"
+        })
+
+    logger.debug("开始分段分析，共 %s 段", total)
+    try:
+        with metrics.task_seconds.time(task="map"):
+            await asyncio.gather(*(analyze(i, c) for i, c in enumerate(chunks)))
+    except Exception:
+        metrics.task_errors_total.inc(task="map")
+        raise
+    logger.debug("分段分析完成")
+
+    return MAP_REDUCE_PREFIX + "\n\n".join(
+        f"【第 {i + 1} 部分】\n{note}" for i, note in enumerate(notes)
+    )
+
 # 处理JSON结构化任务的辅助函数        
-async def process_json_task(paper_text, result_queue):
+async def process_json_task(paper_text, result_queue, persona=None, temperature=None, tags=None):
     """
     处理JSON结构化任务
     
     Args:
         paper_text: 论文文本内容
         result_queue: 结果队列
+        persona: 评审人角色描述，为空时使用默认角色
+        temperature: 采样温度，默认使用 json 阶段的配置
+        tags: 附加到每个事件上的字段
+
+    Returns:
+        dict: 解析（必要时修复）后的 JSON 结构，失败时返回 None
     """
+    tags = tags or {}
+    # 结构化提取只使用输出内容，可以配置为更快的非推理模型
+    options = stage_options("json")
+    started = time.monotonic()
     try:
         # 获取JSON提示词
         json_prompt = get_json_prompt()
         if not json_prompt:
-            print("[WARNING] 没有找到JSON提示词，无法生成结构化数据")
+            logger.warning("没有找到JSON提示词，无法生成结构化数据")
             error_msg = {
                 "type": "error",
-                "message": "没有找到JSON提示词，无法生成结构化数据"
+                "message": "没有找到JSON提示词，无法生成结构化数据",
+                **tags
             }
-            await result_queue.put(f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n")
-            return
+            await result_queue.put(error_msg)
+            return None
+        if persona:
+            json_prompt = f"你是{persona}，请从这一角度给出评审意见。\n\n{json_prompt}"
         
         # 调用模型生成JSON结构
-        print("[DEBUG] 开始生成JSON结构化数据")
-        response = client.chat.completions.create(
-            model="deepseek-r1-250120",
-            messages=[
-                {"role": "system", "content": json_prompt},
-                {"role": "user", "content": f"请从以下论文中提取json结构化信息 , 务必注意json的格式！！！！:\n\n{paper_text}"}
-            ],
-            temperature=0.5,
-            max_tokens=10000,
-            stream=True
-        )
-        
-        full_content = ""
-      
-        
-        for chunk in response:
-            if hasattr(chunk.choices[0].delta, 'content'):
-                content = chunk.choices[0].delta.content
+        logger.debug("开始生成JSON结构化数据")
+        # 增量解析输出，顶层字段完整后立即以 json_field 事件返回
+        parser = IncrementalJSONParser()
+
+        # 受全局并发限制，等待空闲的上游调用名额
+        async with llm_semaphore:
+            async for delta in router.stream(
+                messages=[
+                    {"role": "system", "content": json_prompt},
+                    {"role": "user", "content": f"请从以下论文中提取json结构化信息 , 务必注意json的格式！！！！:\n\n{paper_text}"}
+                ],
+                temperature=options["temperature"] if temperature is None else temperature,
+                max_tokens=options["max_tokens"],
+                models=options["models"],
+            ):
+                content = getattr(delta, 'content', None)
                 if content is not None:
-                    full_content += content
-              
                     json_result = {
                         "type": "json_structure",
-                        "json_structure": content
+                        "json_structure": content,
+                        **tags
                     }
-                    await result_queue.put(f"data: {json.dumps(json_result, ensure_ascii=False)}\n\n")
-              
-                    await asyncio.sleep(0.0005)
+                    await result_queue.put(json_result)
+
+                    for field, value in parser.feed(content):
+                        await result_queue.put({
+                            "type": "json_field",
+                            "field": field,
+                            "value": value,
+                            "valid": validate_field(field, value),
+                            **tags
+                        })
         
-        # 输出完整JSON结构
+        # 输出完整JSON结构，能解析（或修复后能解析）时统一为标准JSON格式
+        structure = parser.result()
         json_result = {
             "type": "json_complete",
-            "json_complete": full_content
+            "json_complete": json.dumps(structure, ensure_ascii=False) if structure is not None else parser.text,
+            "valid": structure is not None,
+            **tags
         }
-        await result_queue.put(f"data: {json.dumps(json_result, ensure_ascii=False)}\n\n")
-        print(f"[DEBUG] JSON结构生成完成")
+        await result_queue.put(json_result)
+        logger.debug("JSON结构生成完成")
+        return structure
         
     except Exception as e:
-        print(f"[ERROR] 生成JSON结构异常: {str(e)}")
-        import traceback
-        print(f"[ERROR] JSON结构生成异常堆栈: {traceback.format_exc()}")
+        metrics.task_errors_total.inc(task="json")
+        logger.exception("生成JSON结构异常: %s", e)
         error_msg = {
             "type": "error",
-            "message": str(e)
+            "message": str(e),
+            **tags
         }
-        await result_queue.put(f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n") 
\ No newline at end of file
+        await result_queue.put(error_msg)
+        return None
+    finally:
+        metrics.task_seconds.observe(time.monotonic() - started, task="json")
@@ -0,0 +1,175 @@
+import copy
+import json
+import asyncio
+import contextlib
+from collections import Counter
+
+from app.service.processors import process_review_task, process_json_task, stage_options
+from utils.conf import get_conf
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.reviewers")
+reviewers_conf = conf.get("reviewers", {})
+
+# 各评审人的角色，第一位使用默认角色
+REVIEWER_PERSONAS = [
+    None,
+    "侧重研究方法与实验设计严谨性的评审专家",
+    "侧重创新性与学术价值的评审专家",
+    "侧重研究基础与可行性的评审专家",
+    "侧重经济社会意义与应用前景的评审专家",
+]
+
+# 各评审人相对所在阶段采样温度的偏移
+TEMPERATURE_OFFSETS = [0.0, 0.1, -0.1, 0.2, -0.2]
+
+# 全局的额外评审人并发预算：第二位及以后的评审人都要先占用该名额，
+# 保证多评审人请求不会占满上游并发、饿死其他用户的评审
+extra_reviewer_semaphore = asyncio.Semaphore(reviewers_conf.get("extra_concurrency", 8))
+
+
+def max_reviewers():
+    """单次请求允许的评审人数上限"""
+    return min(reviewers_conf.get("max_per_request", 5), len(REVIEWER_PERSONAS))
+
+
+def reviewer_profiles(num_reviewers):
+    """
+    生成各评审人的角色和采样温度
+
+    Args:
+        num_reviewers: 评审人数量
+
+    Returns:
+        list: [{"reviewer": 编号, "persona": 角色, "offset": 温度偏移}]
+    """
+    return [
+        {
+            "reviewer": i + 1,
+            "persona": REVIEWER_PERSONAS[i],
+            "offset": TEMPERATURE_OFFSETS[i],
+        }
+        for i in range(num_reviewers)
+    ]
+
+
+def _clamp_temperature(value):
+    return round(min(max(value, 0.0), 1.5), 2)
+
+
+def aggregate_structures(structures):
+    """
+    合并多位评审人的 JSON 结构
+
+    选择题（evaluationSections）按多数票确定推荐选项并汇总各评审人的理由，
+    文字评价（textualEvaluations）按评审人依次拼接。
+
+    Args:
+        structures: [(评审人编号, JSON 对象)]
+
+    Returns:
+        dict: 合并后的 JSON 结构，没有可用结构时返回 None
+    """
+    valid = [(index, data) for index, data in structures if isinstance(data, dict)]
+    if not valid:
+        return None
+
+    merged = copy.deepcopy(valid[0][1])
+
+    def find_item(data, key, item_id):
+        for item in data.get(key) or []:
+            if isinstance(item, dict) and item.get("id") == item_id:
+                return item
+        return None
+
+    for section in merged.get("evaluationSections") or []:
+        if not isinstance(section, dict):
+            continue
+        votes = Counter()
+        reasons = []
+        for index, data in valid:
+            item = find_item(data, "evaluationSections", section.get("id"))
+            if item is None:
+                continue
+            if item.get("aiRecommendation"):
+                votes[item["aiRecommendation"]] += 1
+            if item.get("aiReason"):
+                reasons.append(f"【评审人{index}】{item['aiReason']}")
+        if votes:
+            section["aiRecommendation"] = votes.most_common(1)[0][0]
+            section["votes"] = dict(votes)
+        if reasons:
+            section["aiReason"] = "\n".join(reasons)
+
+    for evaluation in merged.get("textualEvaluations") or []:
+        if not isinstance(evaluation, dict):
+            continue
+        opinions = []
+        for index, data in valid:
+            item = find_item(data, "textualEvaluations", evaluation.get("id"))
+            if item is not None and item.get("aiRecommendation"):
+                opinions.append(f"【评审人{index}】\n{item['aiRecommendation']}")
+        if opinions:
+            evaluation["aiRecommendation"] = "\n\n".join(opinions)
+
+    merged["reviewerCount"] = len(valid)
+    return merged
+
+
+async def process_panel_task(paper_text, result_queue, markdown_prompt, num_reviewers):
+    """
+    多评审人并发评审，所有事件带上 reviewer 编号，最后输出合并后的 JSON 结构
+
+    每位评审人使用单次调用模式生成评审内容，并各自生成一份 JSON 结构。
+
+    Args:
+        paper_text: 论文文本内容
+        result_queue: 结果队列
+        markdown_prompt: Markdown格式要求
+        num_reviewers: 评审人数量
+    """
+    # 单次请求内同时进行的评审人数量
+    request_semaphore = asyncio.Semaphore(max(1, reviewers_conf.get("per_request_concurrency", 2)))
+
+    async def run_reviewer(profile):
+        index = profile["reviewer"]
+        tags = {"reviewer": index}
+        # 第一位评审人与普通请求同等对待，其余评审人占用全局额外预算
+        extra_budget = extra_reviewer_semaphore if index > 1 else contextlib.nullcontext()
+        async with request_semaphore, extra_budget:
+            logger.debug("评审人%s开始评审", index)
+            # 在各阶段配置的采样温度基础上按评审人偏移
+            _, structure = await asyncio.gather(
+                process_review_task(
+                    paper_text, result_queue, markdown_prompt,
+                    persona=profile["persona"],
+                    temperature=_clamp_temperature(stage_options("reasoning")["temperature"] + profile["offset"]),
+                    tags=tags,
+                ),
+                process_json_task(
+                    paper_text, result_queue,
+                    persona=profile["persona"],
+                    temperature=_clamp_temperature(stage_options("json")["temperature"] + profile["offset"]),
+                    tags=tags,
+                ),
+            )
+        return index, structure
+
+    structures = await asyncio.gather(*(run_reviewer(p) for p in reviewer_profiles(num_reviewers)))
+
+    merged = aggregate_structures(structures)
+    if merged is None:
+        await result_queue.put({
+            "type": "error",
+            "message": "所有评审人的JSON结构均无法解析，无法合并"
+        })
+        return
+
+    # 不带 reviewer 编号的 json_complete 为合并后的最终结果
+    await result_queue.put({
+        "type": "json_complete",
+        "json_complete": json.dumps(merged, ensure_ascii=False),
+        "valid": True
+    })
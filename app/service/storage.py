@@ -0,0 +1,364 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import hashlib
+import sqlite3
+import concurrent.futures
+
+from app.service import metrics
+from app.service.cache import resolve_cache_dir
+from app.service.owner import OWNER, owner_alive
+from utils.conf import get_conf
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.storage")
+upload_conf = conf.get("upload", {})
+
+# 上传 ID 为 32 位十六进制字符串，校验后才查询，避免任意输入进入路径
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# 内容哈希为 64 位十六进制的 SHA-256
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+# 未完成上传留下的分块文件超过该时间（秒）后清理
+PART_TTL = 3600
+
+
+def upload_dir(*parts):
+    """上传文件目录，位于所有 worker 进程共享的缓存目录下"""
+    return resolve_cache_dir("uploads", *parts)
+
+
+def new_upload_id():
+    """生成新的上传 ID"""
+    return uuid.uuid4().hex
+
+
+def new_part_path():
+    """上传过程中写入的临时分块文件路径，每次上传各不相同"""
+    return os.path.join(upload_dir("tmp"), f"{uuid.uuid4().hex}.part")
+
+
+def write_part(src, max_bytes, chunk_size=1024 * 1024):
+    """
+    将文件对象写入临时分块文件并计算内容哈希（同步执行，用于批量上传和压缩包中的文件）
+
+    Args:
+        src: 可读的二进制文件对象
+        max_bytes: 文件大小上限
+        chunk_size: 每次读写的字节数
+
+    Returns:
+        tuple: (临时文件路径, SHA-256, 文件大小)
+
+    Raises:
+        ValueError: 不是 PDF 文件或超过大小上限
+    """
+    part_path = new_part_path()
+    digest = hashlib.sha256()
+    total_bytes = 0
+    try:
+        with open(part_path, "wb") as buffer:
+            for chunk in iter(lambda: src.read(chunk_size), b""):
+                if total_bytes == 0 and not chunk.startswith(b"%PDF"):
+                    raise ValueError("只接受 PDF 文件")
+                total_bytes += len(chunk)
+                if total_bytes > max_bytes:
+                    raise ValueError(f"文件过大，最大允许 {max_bytes // 1024 // 1024} MB")
+                digest.update(chunk)
+                buffer.write(chunk)
+        if total_bytes == 0:
+            raise ValueError("只接受 PDF 文件")
+    except BaseException:
+        os.unlink(part_path)
+        raise
+    return part_path, digest.hexdigest(), total_bytes
+
+
+class UploadStore:
+    """
+    按内容哈希去重的上传文件存储
+
+    文件内容只保存一份（blobs/<sha256>.pdf），每次上传登记一个上传 ID 指向该内容。
+    评审开始时为文件加引用（记录所属进程），结束后释放。后台清理按最近访问时间删除
+    超过有效期的上传，并在磁盘占用超过上限时按 LRU 淘汰；有引用的文件不会被删除。
+    元数据保存在共享缓存目录的 SQLite 中，多个 worker 进程可以同时使用。
+
+    数据库事务（多进程部署时可能等待写锁，最长 busy_timeout）和文件操作都在专用线程中
+    按提交顺序执行，不阻塞事件循环，同一连接上的事务也不会交错。
+    """
+
+    def __init__(self, db_path, ttl_seconds=86400, max_bytes=2048 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "hash TEXT PRIMARY KEY, size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "id TEXT PRIMARY KEY, hash TEXT NOT NULL, file_name TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS uploads_hash ON uploads (hash)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, hash TEXT NOT NULL, owner TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash)")
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="uploads")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def blob_path(self, file_hash):
+        return os.path.join(upload_dir("blobs"), f"{file_hash}.pdf")
+
+    async def put(self, part_path, file_hash, size, file_name):
+        """
+        保存上传完成的分块文件并登记上传 ID
+
+        内容已存在时丢弃分块文件，只登记新的上传 ID。文件放置与登记在同一事务中完成，
+        不会与清理任务交错。
+
+        Args:
+            part_path: 已写完的临时文件
+            file_hash: 文件内容的 SHA-256
+            size: 文件大小（字节）
+            file_name: 原文件名，只用于展示
+
+        Returns:
+            tuple: (上传 ID, 文件路径, 内容是否已存在)
+        """
+        return await self._run(self._put, part_path, file_hash, size, file_name)
+
+    def _put(self, part_path, file_hash, size, file_name):
+        upload_id = new_upload_id()
+        path = self.blob_path(file_hash)
+        now = time.time()
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            existing = self.db.execute("SELECT 1 FROM blobs WHERE hash = ?", (file_hash,)).fetchone()
+            duplicate = existing is not None and os.path.exists(path)
+            if duplicate:
+                os.unlink(part_path)
+                self.db.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (now, file_hash))
+            else:
+                os.replace(part_path, path)
+                self.db.execute(
+                    "INSERT OR REPLACE INTO blobs (hash, size, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (file_hash, size, now, now),
+                )
+            self.db.execute(
+                "INSERT INTO uploads (id, hash, file_name, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (upload_id, file_hash, file_name, now, now),
+            )
+        return upload_id, path, duplicate
+
+    async def acquire(self, upload_id=None, file_path=None):
+        """
+        为评审使用的文件加引用，引用期间文件不会被清理
+
+        Args:
+            upload_id: 上传 ID
+            file_path: 旧版用法传入的文件路径（上传接口返回的 file_path），必须位于本存储中
+
+        Returns:
+            tuple: (文件路径, 引用 ID, 内容哈希)；上传 ID 不存在或文件已被清理时均为 None
+
+        Raises:
+            ValueError: 上传 ID 格式不正确，或 file_path 不是本存储中的文件
+        """
+        return await self._run(self._acquire, upload_id, file_path)
+
+    def _acquire(self, upload_id, file_path):
+        if upload_id is not None:
+            if not isinstance(upload_id, str) or not UPLOAD_ID_PATTERN.match(upload_id):
+                raise ValueError(f"无效的上传 ID: {upload_id}")
+            row = self.db.execute("SELECT hash FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+            if row is None:
+                return None, None, None
+            file_hash = row[0]
+        else:
+            file_hash = self.path_hash(file_path)
+            if file_hash is None:
+                raise ValueError("只能评审通过上传接口上传的文件")
+
+        path = self.blob_path(file_hash)
+        now = time.time()
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            if self.db.execute("SELECT 1 FROM blobs WHERE hash = ?", (file_hash,)).fetchone() is None or not os.path.exists(path):
+                return None, None, None
+            cursor = self.db.execute(
+                "INSERT INTO refs (hash, owner, created_at) VALUES (?, ?, ?)", (file_hash, OWNER, now)
+            )
+            self.db.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (now, file_hash))
+            if upload_id is not None:
+                self.db.execute("UPDATE uploads SET last_access = ? WHERE id = ?", (now, upload_id))
+        return path, cursor.lastrowid, file_hash
+
+    def path_hash(self, file_path):
+        """
+        Returns:
+            str: 本存储中文件路径对应的内容哈希；路径（解析符号链接后）不在存储目录中时为 None
+        """
+        if not isinstance(file_path, str):
+            return None
+        path = os.path.realpath(file_path)
+        name, ext = os.path.splitext(os.path.basename(path))
+        if os.path.dirname(path) != os.path.realpath(upload_dir("blobs")) or ext != ".pdf" or not HASH_PATTERN.match(name):
+            return None
+        return name
+
+    async def ref_path(self, ref_id):
+        """
+        Returns:
+            tuple: (引用对应的文件路径, 内容哈希)，引用不存在或文件已被删除时均为 None
+        """
+        return await self._run(self._ref_path, ref_id)
+
+    def _ref_path(self, ref_id):
+        row = self.db.execute("SELECT hash FROM refs WHERE id = ?", (ref_id,)).fetchone()
+        if row is None:
+            return None, None
+        path = self.blob_path(row[0])
+        return (path, row[0]) if os.path.exists(path) else (None, None)
+
+    async def release(self, ref_id):
+        """释放 acquire 返回的引用，并刷新最近访问时间"""
+        if ref_id is None:
+            return
+        await self._run(self._release, ref_id)
+
+    def _release(self, ref_id):
+        now = time.time()
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            row = self.db.execute("SELECT hash FROM refs WHERE id = ?", (ref_id,)).fetchone()
+            if row is None:
+                return
+            self.db.execute("DELETE FROM refs WHERE id = ?", (ref_id,))
+            self.db.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (now, row[0]))
+
+    async def sweep(self):
+        """
+        清理过期上传与超出磁盘上限的文件
+
+        Returns:
+            dict: 按原因（ttl / quota）统计删除的文件数
+        """
+        return await self._run(self._sweep)
+
+    def _sweep(self):
+        now = time.time()
+        deleted = {"ttl": 0, "quota": 0}
+        with self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            # 所属进程已经退出的引用不再有效
+            for ref_id, owner in self.db.execute("SELECT id, owner FROM refs").fetchall():
+                if not owner_alive(owner) and owner != OWNER:
+                    self.db.execute("DELETE FROM refs WHERE id = ?", (ref_id,))
+
+            self.db.execute(
+                "DELETE FROM uploads WHERE last_access < ? AND hash NOT IN (SELECT hash FROM refs)",
+                (now - self.ttl_seconds,),
+            )
+            rows = self.db.execute(
+                "SELECT hash, size, last_access, "
+                "EXISTS (SELECT 1 FROM uploads WHERE uploads.hash = blobs.hash), "
+                "EXISTS (SELECT 1 FROM refs WHERE refs.hash = blobs.hash) "
+                "FROM blobs ORDER BY last_access"
+            ).fetchall()
+
+            removed = []
+            kept = []
+            for file_hash, size, last_access, has_uploads, has_refs in rows:
+                if has_refs:
+                    kept.append((file_hash, size, False))
+                elif not has_uploads or last_access < now - self.ttl_seconds:
+                    removed.append(file_hash)
+                    deleted["ttl"] += 1
+                else:
+                    kept.append((file_hash, size, True))
+
+            # 仍超过磁盘上限时，从最久未访问的无引用文件开始淘汰
+            total_bytes = sum(size for _, size, _ in kept)
+            for file_hash, size, evictable in kept:
+                if total_bytes <= self.max_bytes:
+                    break
+                if evictable:
+                    removed.append(file_hash)
+                    deleted["quota"] += 1
+                    total_bytes -= size
+
+            for file_hash in removed:
+                self.db.execute("DELETE FROM uploads WHERE hash = ?", (file_hash,))
+                self.db.execute("DELETE FROM blobs WHERE hash = ?", (file_hash,))
+                try:
+                    os.unlink(self.blob_path(file_hash))
+                except FileNotFoundError:
+                    pass
+            count = len(rows) - len(removed)
+
+        self._sweep_parts(now)
+        metrics.upload_store_bytes.set(total_bytes)
+        metrics.upload_store_files.set(count)
+        for reason, value in deleted.items():
+            if value:
+                metrics.upload_sweep_deleted_total.inc(value, reason=reason)
+        return deleted
+
+    def _sweep_parts(self, now):
+        # 上传中断（进程退出等）留下的分块文件
+        tmp_dir = upload_dir("tmp")
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            try:
+                if now - os.path.getmtime(path) > PART_TTL:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.db.close()
+
+
+async def run_sweeper(store, interval):
+    """
+    定期清理上传存储，在应用启动时作为后台任务运行
+
+    Args:
+        store: UploadStore
+        interval: 清理间隔（秒）
+    """
+    while True:
+        try:
+            # 与请求处理共用同一个数据库连接和执行线程，事务不会交错
+            deleted = await store.sweep()
+            if any(deleted.values()):
+                logger.info("清理上传文件: 过期 %s 个，超出磁盘上限 %s 个", deleted["ttl"], deleted["quota"])
+        except Exception as e:
+            logger.error("上传文件清理失败: %s", e)
+        await asyncio.sleep(interval)
+
+
+def _db_path():
+    path = upload_conf.get("db", "uploads.db")
+    if not os.path.isabs(path):
+        path = os.path.join(resolve_cache_dir(), path)
+    return path
+
+
+upload_store = UploadStore(
+    _db_path(),
+    ttl_seconds=upload_conf.get("ttl_hours", 24) * 3600,
+    max_bytes=upload_conf.get("max_disk_mb", 2048) * 1024 * 1024,
+)
@@ -0,0 +1,186 @@
+import json
+import asyncio
+
+from app.service import metrics
+from utils.log import get_logger
+
+logger = get_logger("app.service.streaming")
+
+# 生产者结束标记，每个生产者结束时放入一次
+_DONE = object()
+
+# 可以合并的增量事件类型，及其承载文本的字段名
+MERGEABLE_FIELDS = {
+    "reasoning": "reasoning",
+    "content": "content",
+    "json_structure": "json_structure",
+}
+
+
+def format_sse(data):
+    """
+    将事件字典格式化为 SSE 数据帧
+
+    Args:
+        data: 事件字典
+
+    Returns:
+        str: 以 "data: " 开头、以空行结尾的 SSE 帧
+    """
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class FanIn:
+    """
+    多生产者、单消费者的结果汇聚
+
+    每个生产者任务向共享队列写入事件字典，结束时（无论成功、异常还是被取消）
+    写入一个结束标记。消费者在收到全部结束标记后立即退出，不依赖定时轮询；
+    由于结束标记与结果共用同一个 FIFO 队列，生产者的所有输出一定先于其结束标记被读取。
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self._tasks = []
+        self._remaining = 0
+        # 已读取的错误事件数量
+        self.errors = 0
+
+    def spawn(self, label, coro):
+        """
+        启动一个生产者任务
+
+        Args:
+            label: 任务名称，用于错误提示
+            coro: 生产者协程，通过 self.queue 输出结果
+
+        Returns:
+            asyncio.Task: 生产者任务，结果为协程的返回值（出错时为 None）
+        """
+        self._remaining += 1
+        task = asyncio.create_task(self._run(label, coro))
+        self._tasks.append(task)
+        return task
+
+    async def _run(self, label, coro):
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("%s异常: %s", label, e)
+            error_msg = {
+                "type": "error",
+                "message": f"{label}异常: {str(e)}"
+            }
+            await self.queue.put(error_msg)
+        finally:
+            self.queue.put_nowait(_DONE)
+
+    async def get(self):
+        """
+        获取下一条结果
+
+        Returns:
+            下一条结果；所有生产者都已结束且队列已读空时返回 None
+        """
+        while self._remaining:
+            item = await self.queue.get()
+            if item is _DONE:
+                self._remaining -= 1
+                continue
+            if item.get("type") == "error":
+                self.errors += 1
+            return item
+        return None
+
+    async def __aiter__(self):
+        while True:
+            item = await self.get()
+            if item is None:
+                return
+            yield item
+
+    def cancel(self):
+        """取消所有尚未完成的生产者任务"""
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def coalesce(fan_in, window_ms=30, max_bytes=4096):
+    """
+    合并增量事件并编码为 SSE 帧
+
+    同类型的连续增量（reasoning / content / json_structure）在时间窗口内合并为一个事件，
+    缓存达到 max_bytes 或窗口到期时一次性输出；其他事件会先冲刷缓存再原样输出，保证顺序。
+
+    Args:
+        fan_in: FanIn 实例
+        window_ms: 合并时间窗口（毫秒），为 0 时不合并
+        max_bytes: 缓存的最大字节数，超过后立即输出
+
+    Yields:
+        str: 一个或多个 SSE 帧拼接成的字符串
+    """
+    loop = asyncio.get_running_loop()
+    window = max(window_ms, 0) / 1000
+    # 合并键 -> [事件字典, 文本片段列表]，按首次到达的顺序输出
+    pending = {}
+    pending_bytes = 0
+    deadline = 0.0
+
+    def flush(extra_events=0):
+        nonlocal pending_bytes
+        frames = []
+        events = extra_events
+        for event, parts in pending.values():
+            event[MERGEABLE_FIELDS[event["type"]]] = "".join(parts)
+            frames.append(format_sse(event))
+            events += len(parts)
+        pending.clear()
+        pending_bytes = 0
+        # 记录每批合并的事件数，以及输出时队列中仍在等待的事件数（积压）
+        metrics.stream_batch_events.observe(events)
+        metrics.stream_queue_depth.observe(fan_in.queue.qsize())
+        return "".join(frames)
+
+    while True:
+        if pending:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                yield flush()
+                continue
+            try:
+                item = await asyncio.wait_for(fan_in.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush()
+                continue
+        else:
+            item = await fan_in.get()
+
+        if item is None:
+            break
+
+        field = MERGEABLE_FIELDS.get(item.get("type"))
+        if field is None or window <= 0:
+            # 非增量事件：先输出已缓存的内容，再输出该事件
+            yield flush(extra_events=1) + format_sse(item)
+            continue
+
+        text = item[field]
+        # 除文本字段外其余字段都相同的事件才能合并
+        key = tuple((k, v) for k, v in item.items() if k != field)
+        if key in pending:
+            pending[key][1].append(text)
+        else:
+            if not pending:
+                deadline = loop.time() + window
+            pending[key] = [dict(item), [text]]
+        pending_bytes += len(text.encode("utf-8"))
+
+        if pending_bytes >= max_bytes:
+            yield flush()
+
+    if pending:
+        yield flush()
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart 0.0.13 之前的包名
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# multipart 边界、各部分的头部和其他表单字段允许占用的字节数，Content-Length 超过文件上限加上该值时直接拒绝
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadError(ValueError):
+    """上传被拒绝，status_code 为返回的 HTTP 状态码"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def receive_pdf(request, part_path, max_bytes, field="file"):
+    """
+    边接收 multipart 请求体边将其中的 PDF 写入临时文件，并计算内容哈希
+
+    直接解析 request.stream()，不经过框架对整个请求体的缓存，超过大小上限时立即停止接收；
+    Content-Length 已经超过上限时不读取请求体。文件写入在线程池中执行。
+
+    Args:
+        request: 原始请求
+        part_path: 写入的临时文件路径
+        max_bytes: 文件大小上限
+        field: 文件所在的表单字段名
+
+    Returns:
+        tuple: (原文件名, SHA-256, 文件大小)
+
+    Raises:
+        UploadError: 不是 multipart 请求、缺少文件、不是 PDF 文件（400）或超过大小上限（413）
+    """
+    too_large = UploadError(f"文件过大，最大允许 {max_bytes // 1024 // 1024} MB", status_code=413)
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + FORM_OVERHEAD:
+        raise too_large
+
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("请以 multipart/form-data 上传文件")
+
+    state = {"headers": {}, "field": b"", "value": b"", "target": False, "file_name": None, "done": False}
+    digest = hashlib.sha256()
+    head = bytearray()
+    pending = []
+    total = 0
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition"))
+        # 只接收第一个指定字段的文件，其余字段和文件忽略
+        if not state["done"] and disposition.get(b"name") == field.encode() and b"filename" in disposition:
+            state["target"] = True
+            state["file_name"] = disposition[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(data, start, end):
+        nonlocal total
+        if not state["target"]:
+            return
+        chunk = bytes(data[start:end])
+        if len(head) < 4:
+            head.extend(chunk[:4 - len(head)])
+            if len(head) == 4 and head != b"%PDF":
+                raise UploadError("只接受 PDF 文件")
+        total += len(chunk)
+        if total > max_bytes:
+            raise too_large
+        digest.update(chunk)
+        pending.append(chunk)
+
+    def on_part_end():
+        if state["target"]:
+            state["target"] = False
+            state["done"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    loop = asyncio.get_running_loop()
+    with open(part_path, "wb") as buffer:
+        async for body in request.stream():
+            parser.write(body)
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                await loop.run_in_executor(None, buffer.write, data)
+        parser.finalize()
+
+    if state["file_name"] is None:
+        raise UploadError(f"缺少上传文件（表单字段 {field}）")
+    if total < 4 or head != b"%PDF":
+        raise UploadError("只接受 PDF 文件")
+    return state["file_name"], digest.hexdigest(), total
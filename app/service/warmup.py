@@ -0,0 +1,92 @@
+import time
+import asyncio
+
+from app.service import metrics
+from app.service.extractors import warm_process_pool
+from app.service.llm import router
+from utils.conf import get_conf
+from utils.get_prompt import get_json_prompt, get_markdown_prompt
+from utils.log import get_logger
+
+# 获取配置
+conf = get_conf()
+logger = get_logger("app.service.warmup")
+warmup_conf = conf.get("warmup", {})
+
+# 就绪状态
+STATE_STARTING = "starting"
+STATE_WARMING = "warming"
+STATE_READY = "ready"
+STATE_STOPPING = "stopping"
+
+
+class Warmup:
+    """
+    启动预热与就绪状态
+
+    应用启动后在后台读取提示词、启动 PDF 解析进程并预先建立到各上游提供方的连接，完成后才报告就绪，
+    滚动重启时负载均衡只会把请求转发给已预热的实例。预热失败的步骤只记录日志，不阻止就绪
+    （上游暂时不可用时仍由路由切换提供方处理）。
+    """
+
+    def __init__(self):
+        self.state = STATE_STARTING
+        self.steps = {}
+        self._task = None
+
+    @property
+    def ready(self):
+        return self.state == STATE_READY
+
+    def start(self):
+        """在后台开始预热，不阻塞应用启动"""
+        self.state = STATE_WARMING
+        self._task = asyncio.create_task(self._run())
+
+    async def _step(self, name, coro):
+        started = time.monotonic()
+        try:
+            result = await coro
+            self.steps[name] = {"ok": True, "result": result}
+        except Exception as e:
+            logger.warning("预热步骤 %s 失败: %s", name, e)
+            self.steps[name] = {"ok": False, "error": str(e)}
+        self.steps[name]["seconds"] = round(time.monotonic() - started, 3)
+
+    async def _prompts(self):
+        return {"markdown": len(get_markdown_prompt()), "json": len(get_json_prompt())}
+
+    async def _run(self):
+        started = time.monotonic()
+        steps = [self._step("prompts", self._prompts())]
+        if warmup_conf.get("process_pool", True):
+            steps.append(self._step("process_pool", warm_process_pool()))
+        connections = warmup_conf.get("connections", 2)
+        if connections > 0:
+            steps.append(self._step("upstream", router.warmup(connections, warmup_conf.get("timeout", 10))))
+        await asyncio.gather(*steps)
+
+        elapsed = time.monotonic() - started
+        metrics.startup_seconds.set(elapsed, phase="warmup")
+        if self.state == STATE_WARMING:
+            self.state = STATE_READY
+            metrics.ready.set(1)
+        logger.info("预热完成，耗时 %.2f 秒: %s", elapsed, self.steps)
+
+    def status(self):
+        """
+        Returns:
+            dict: 就绪状态与各预热步骤的结果
+        """
+        return {"status": self.state, "steps": self.steps}
+
+    async def stop(self):
+        """应用关闭时先报告未就绪，负载均衡停止转发新请求"""
+        self.state = STATE_STOPPING
+        metrics.ready.set(0)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+warmup = Warmup()
@@ -12,5 +12,5 @@ conf = get_conf()
 logger = get_logger("server.main")
 
 if __name__ == '__main__':
-    logger.info(f"启动服务，环境: {conf['env']}")
+    logger.info("启动服务，环境: %s", conf["env"])
     launch_app(conf["server"]["host"], conf["server"]["port"])
@@ -0,0 +1,111 @@
+"""
+PDF 解析引擎基准测试
+
+用每个已安装的解析引擎提取 doc/data/ 下全部 PDF 的文本，统计解析速度（页/秒）、提取的字符数、
+空白页数、中文字符比例和文本质量分数（与自动选择引擎时使用的评分相同），并给出按当前配置
+自动选择的引擎。
+
+用法：
+    python test/bench/extract.py
+    python test/bench/extract.py --engines pypdfium2 PyPDF2 --repeat 3 --output extract.json
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+from app.service import pdf_engines  # noqa: E402
+from app.service.extractors import engine_options  # noqa: E402
+
+
+def bench_engine(name, pdf_path, repeat, min_chars_per_page):
+    """用一个引擎完整提取一篇 PDF，返回最快一次的耗时与文本统计"""
+    engine = pdf_engines.ENGINES[name]
+    best = None
+    texts = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        num_pages = engine.count_pages(pdf_path)
+        texts = engine.extract_pages(pdf_path, 0, num_pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "pages": len(texts),
+        "seconds": round(best, 3),
+        "pages_per_second": round(len(texts) / best, 1) if best > 0 else None,
+        "chars": sum(len(text) for text in texts),
+        "empty_pages": sum(1 for text in texts if not text.strip()),
+        "cjk_ratio": round(pdf_engines.cjk_ratio(texts), 3),
+        "quality": round(pdf_engines.text_quality(texts, min_chars_per_page), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default=os.path.join(ROOT_DIR, "doc", "data"))
+    parser.add_argument("--engines", nargs="+", help="测试的引擎，默认为全部已安装的引擎")
+    parser.add_argument("--repeat", type=int, default=1, help="每个引擎重复提取的次数，取最快的一次")
+    parser.add_argument("--output", help="将结果以 JSON 写入该文件")
+    args = parser.parse_args()
+
+    options = engine_options()
+    engines = pdf_engines.candidate_engines("auto", args.engines or pdf_engines.DEFAULT_ENGINES)
+    missing = [name for name in pdf_engines.ENGINES if name not in engines and not pdf_engines.ENGINES[name].available()]
+    if missing:
+        print(f"未安装的引擎: {', '.join(missing)}")
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not pdf_paths:
+        raise SystemExit(f"没有找到 PDF 文件: {args.pdf_dir}")
+
+    report = {"documents": [], "engines": {}}
+    header = f"{'engine':>10} {'pages':>6} {'pages/s':>8} {'chars':>8} {'empty':>6} {'cjk':>6} {'quality':>8}"
+    for pdf_path in pdf_paths:
+        selected = pdf_engines.select_engine(
+            pdf_path, options["engines"], options["probe_pages"], options["min_quality"], options["min_chars_per_page"],
+        )[0]
+        document = {"file": os.path.basename(pdf_path), "selected": selected, "engines": {}}
+        print(f"\n{document['file']}（自动选择: {selected}）")
+        print(header)
+        for name in engines:
+            try:
+                result = bench_engine(name, pdf_path, args.repeat, options["min_chars_per_page"])
+            except Exception as e:
+                result = {"error": str(e)}
+                print(f"{name:>10} 失败: {e}")
+            else:
+                print(
+                    f"{name:>10} {result['pages']:>6} {result['pages_per_second']:>8} {result['chars']:>8} "
+                    f"{result['empty_pages']:>6} {result['cjk_ratio']:>6} {result['quality']:>8}"
+                )
+            document["engines"][name] = result
+        report["documents"].append(document)
+
+    # 按引擎汇总全部文档：总页数 / 总耗时，以及按页数加权的平均质量
+    print("\n汇总")
+    print(f"{'engine':>10} {'pages':>6} {'pages/s':>8} {'quality':>8}")
+    for name in engines:
+        results = [doc["engines"][name] for doc in report["documents"] if "error" not in doc["engines"][name]]
+        pages = sum(result["pages"] for result in results)
+        seconds = sum(result["seconds"] for result in results)
+        summary = {
+            "documents": len(results),
+            "pages": pages,
+            "pages_per_second": round(pages / seconds, 1) if seconds > 0 else None,
+            "quality": round(sum(r["quality"] * r["pages"] for r in results) / pages, 3) if pages else None,
+        }
+        report["engines"][name] = summary
+        print(f"{name:>10} {pages:>6} {summary['pages_per_second']:>8} {summary['quality']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
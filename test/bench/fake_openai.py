@@ -0,0 +1,148 @@
+"""
+本地模拟的 OpenAI 兼容流式服务，用于离线压测
+
+实现 /v1/chat/completions 的流式协议（含 reasoning_content 增量），首个 token 延迟、
+输出速度和各部分长度均可配置，不调用任何真实模型。
+
+用法：
+    python test/bench/fake_openai.py --port 9999 --ttft 0.8 --tokens-per-sec 40
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 与 doc/prompt/Json_prompt.md 约定结构一致的示例输出
+SAMPLE_STRUCTURE = {
+    "formTitle": "评审意见表",
+    "projectInfo": {
+        "projectTitle": "压测论文",
+        "projectType": "一般项目",
+        "researchField": "电子商务",
+        "applicantName": "亲~信息不足",
+        "applicationId": "亲~信息不足",
+    },
+    "evaluationSections": [
+        {
+            "id": "applicantQualification",
+            "title": "Agent熟悉程度",
+            "options": ["熟悉", "较熟", "不熟悉"],
+            "required": True,
+            "aiRecommendation": "较熟",
+            "aiReason": "压测生成的理由。",
+        },
+    ],
+    "textualEvaluations": [
+        {
+            "id": "innovation",
+            "title": "创新性评价",
+            "aiRecommendation": "压测生成的评价内容。" * 20,
+        },
+    ],
+}
+
+app = FastAPI(title="模拟 OpenAI 流式服务")
+settings = argparse.Namespace(ttft=0.5, tokens_per_sec=50.0, reasoning_tokens=200, content_tokens=400, chars_per_token=2, fail_rate=0.0)
+stats = {"requests": 0, "failed": 0, "active": 0, "tokens": 0}
+
+
+def _chunk(model, delta, finish_reason=None):
+    data = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _tokens(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _plan(body):
+    """根据请求内容决定输出：JSON 结构化任务输出示例 JSON，其余任务输出推理与评审内容"""
+    messages = body.get("messages") or []
+    prompt = "".join(str(m.get("content", "")) for m in messages)
+    size = max(1, settings.chars_per_token)
+    max_tokens = body.get("max_tokens") or 10 ** 9
+    if "json结构化" in prompt.lower():
+        text = json.dumps(SAMPLE_STRUCTURE, ensure_ascii=False)
+        return [("content", token) for token in _tokens(text, size)]
+    plan = [("reasoning_content", "推理" * size)] * settings.reasoning_tokens
+    plan += [("content", "评审" * size)] * settings.content_tokens
+    return plan[:max_tokens]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    model = body.get("model", "bench")
+    if random.random() < settings.fail_rate:
+        stats["failed"] += 1
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+
+    plan = _plan(body)
+    if not body.get("stream"):
+        await asyncio.sleep(settings.ttft + len(plan) / settings.tokens_per_sec)
+        message = {"role": "assistant"}
+        for field, token in plan:
+            message[field] = message.get(field, "") + token
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+        }
+
+    async def generate():
+        stats["active"] += 1
+        try:
+            await asyncio.sleep(settings.ttft)
+            started = time.monotonic()
+            yield _chunk(model, {"role": "assistant", "content": ""})
+            for i, (field, token) in enumerate(plan):
+                # 按绝对时间安排输出，避免逐个 sleep 累积误差
+                delay = started + i / settings.tokens_per_sec - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                stats["tokens"] += 1
+                yield _chunk(model, {field: token})
+            yield _chunk(model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+        finally:
+            stats["active"] -= 1
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--ttft", type=float, default=0.5, help="首个 token 延迟（秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="每个流的输出速度（token/秒）")
+    parser.add_argument("--reasoning-tokens", type=int, default=200, help="推理内容的 token 数")
+    parser.add_argument("--content-tokens", type=int, default=400, help="评审内容的 token 数")
+    parser.add_argument("--chars-per-token", type=int, default=2, help="每个 token 的字符数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="随机返回 500 的比例，用于验证提供方切换")
+    args = parser.parse_args()
+    vars(settings).update({k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+评审服务压测脚本
+
+上传 doc/data/ 下的 PDF，并发打开多个 /review 流，统计评审吞吐（次/分钟）、首个 token 延迟
+（从发起评审到收到第一条 reasoning/content 事件）和端到端延迟的 p50/p99，以及服务进程的 CPU 与内存占用。
+
+用法：
+    # 自动启动模拟上游（test/bench/fake_openai.py）和 ENV=bench 的评审服务
+    python test/bench/load.py --spawn --concurrency 16 --reviews 64
+
+    # 压测已经运行的服务，并采样指定进程（含子进程）的 CPU / 内存
+    python test/bench/load.py --url http://127.0.0.1:5555 --server-pid 12345
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(values, q):
+    """最近秩法计算分位数，没有数据时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ProcessSampler:
+    """
+    通过 /proc 采样进程树（服务进程及其 worker、PDF 解析子进程）的 CPU 时间和内存
+
+    仅支持 Linux，其他平台上不输出资源数据。
+    """
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.peak_rss = 0
+        self.cpu_start = None
+        self.cpu_end = None
+        self.started = None
+        self.finished = None
+
+    def _tree(self):
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        pids, stack = [], [self.pid]
+        while stack:
+            pid = stack.pop()
+            pids.append(pid)
+            stack.extend(children.get(pid, []))
+        return pids
+
+    def sample(self):
+        """返回 (CPU 秒数, RSS 字节数)"""
+        cpu = 0.0
+        rss = 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu += (int(fields[11]) + int(fields[12])) / self.ticks
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            rss += int(line.split()[1]) * 1024
+                            break
+            except (OSError, IndexError, ValueError):
+                continue
+        return cpu, rss
+
+    async def run(self, stop):
+        self.started = time.monotonic()
+        self.cpu_start, self.peak_rss = self.sample()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            cpu, rss = self.sample()
+            self.cpu_end = cpu
+            self.peak_rss = max(self.peak_rss, rss)
+        self.finished = time.monotonic()
+
+    def report(self):
+        if self.cpu_end is None or not self.finished:
+            return {}
+        elapsed = self.finished - self.started
+        return {
+            "cpu_percent": round((self.cpu_end - self.cpu_start) / elapsed * 100, 1) if elapsed > 0 else None,
+            "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+        }
+
+
+async def run_review(client, pdf_path, args):
+    """
+    上传一篇 PDF 并完整读取一次评审流
+
+    Returns:
+        dict: 各阶段耗时与结果
+    """
+    result = {"pdf": os.path.basename(pdf_path), "ok": False, "events": 0}
+    started = time.monotonic()
+    with open(pdf_path, "rb") as f:
+        response = await client.post("/upload", files={"file": (os.path.basename(pdf_path), f, "application/pdf")})
+    if response.status_code != 200:
+        result["error"] = f"上传失败: {response.status_code} {response.text[:200]}"
+        return result
+    upload = response.json()
+    result["upload"] = time.monotonic() - started
+
+    body = {
+        "upload_id": upload.get("upload_id"),
+        "file_path": upload.get("file_path"),
+        "page_limit": args.page_limit,
+        "num_reviewers": args.num_reviewers,
+    }
+    review_started = time.monotonic()
+    buffer = ""
+    async with client.stream("POST", "/review", json=body) as stream:
+        if stream.status_code != 200:
+            result["error"] = f"评审请求失败: {stream.status_code}"
+            return result
+        async for chunk in stream.aiter_text():
+            buffer += chunk
+            while "\n\n" in buffer:
+                frame, buffer = buffer.split("\n\n", 1)
+                line = next((l for l in frame.split("\n") if l.startswith("data: ")), None)
+                if line is None:
+                    continue
+                event = json.loads(line[len("data: "):])
+                result["events"] += 1
+                now = time.monotonic() - review_started
+                if event["type"] in ("reasoning", "content") and "ttft" not in result:
+                    result["ttft"] = now
+                elif event["type"] == "complete":
+                    result["ok"] = True
+                    result["latency"] = now
+                elif event["type"] == "error" and "error" not in result:
+                    result["error"] = event.get("message")
+    return result
+
+
+async def run_load(args):
+    pdfs = sorted(
+        os.path.join(args.pdf_dir, name) for name in os.listdir(args.pdf_dir) if name.lower().endswith(".pdf")
+    )
+    if not pdfs:
+        raise SystemExit(f"{args.pdf_dir} 下没有 PDF 文件")
+
+    sampler = ProcessSampler(args.server_pid) if args.server_pid and os.path.isdir("/proc") else None
+    stop = asyncio.Event()
+    sampler_task = asyncio.create_task(sampler.run(stop)) if sampler else None
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        async def worker(index):
+            async with semaphore:
+                try:
+                    return await run_review(client, pdfs[index % len(pdfs)], args)
+                except Exception as e:
+                    return {"pdf": os.path.basename(pdfs[index % len(pdfs)]), "ok": False, "error": repr(e)}
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(worker(i) for i in range(args.reviews)))
+        wall = time.monotonic() - started
+
+    stop.set()
+    if sampler_task:
+        await sampler_task
+
+    completed = [r for r in results if r["ok"]]
+    ttfts = [r["ttft"] for r in completed if "ttft" in r]
+    latencies = [r["latency"] for r in completed]
+    uploads = [r["upload"] for r in results if "upload" in r]
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    report = {
+        "reviews": args.reviews,
+        "concurrency": args.concurrency,
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "wall_seconds": round(wall, 2),
+        "reviews_per_min": round(len(completed) / wall * 60, 2) if wall > 0 else None,
+        "ttft_p50_ms": ms(percentile(ttfts, 50)),
+        "ttft_p99_ms": ms(percentile(ttfts, 99)),
+        "latency_p50_ms": ms(percentile(latencies, 50)),
+        "latency_p99_ms": ms(percentile(latencies, 99)),
+        "upload_p50_ms": ms(percentile(uploads, 50)),
+        **(sampler.report() if sampler else {}),
+        "errors": sorted({r["error"] for r in results if r.get("error")})[:10],
+    }
+    return report
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    raise SystemExit(f"服务未就绪: {url}")
+
+
+def spawn_servers(args):
+    """启动模拟上游与 ENV=bench 的评审服务，返回子进程列表"""
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "test", "bench", "fake_openai.py"), "--port", str(args.fake_port), *args.fake_args],
+        cwd=ROOT_DIR,
+    )
+    env = dict(os.environ, ENV="bench")
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT_DIR, env=env)
+    wait_ready(f"http://127.0.0.1:{args.fake_port}/stats")
+    wait_ready(f"{args.url}/readyz")
+    return [fake, server]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5565", help="评审服务地址（默认与 conf/default.bench.yaml 一致）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的评审数")
+    parser.add_argument("--reviews", type=int, default=32, help="评审总数")
+    parser.add_argument("--page-limit", type=int, default=0)
+    parser.add_argument("--num-reviewers", type=int, default=1)
+    parser.add_argument("--pdf-dir", default=os.path.join(ROOT_DIR, "doc", "data"))
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--server-pid", type=int, help="采样 CPU / 内存的服务进程 ID（--spawn 时自动设置）")
+    parser.add_argument("--spawn", action="store_true", help="自动启动模拟上游和 ENV=bench 的评审服务")
+    parser.add_argument("--fake-port", type=int, default=9999)
+    parser.add_argument("--fake-args", nargs=argparse.REMAINDER, default=[], help="传给 fake_openai.py 的参数，放在最后")
+    parser.add_argument("--output", help="将结果以 JSON 写入该文件")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        if args.spawn:
+            processes = spawn_servers(args)
+            args.server_pid = processes[1].pid
+        report = asyncio.run(run_load(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    for key, value in report.items():
+        print(f"{key:>18}: {value}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+app/service/json_stream.py 的单元测试
+
+用法：
+    python -m pytest test/test_json_stream.py
+    python -m unittest test.test_json_stream
+"""
+import os
+import sys
+import json
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from app.service.json_stream import IncrementalJSONParser, repair_json, validate_field  # noqa: E402
+
+DOCUMENT = {
+    "formTitle": "评审意见表",
+    "projectInfo": {"projectTitle": "论文 \"题目\"", "note": "含有 {括号}、[方括号] 和逗号, 的字符串"},
+    "evaluationSections": [
+        {"id": 1, "options": ["优", "良", "差"], "aiRecommendation": "良"},
+    ],
+    "textualEvaluations": [{"id": "t1", "content": "换行\n与反斜杠 \\ 转义"}],
+}
+
+
+def feed_chunks(chunks):
+    """依次输入各段，返回 (完成的字段列表, 解析器)"""
+    parser = IncrementalJSONParser()
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return fields, parser
+
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class IncrementalJSONParserTest(unittest.TestCase):
+
+    def test_fields_complete_in_order(self):
+        text = json.dumps(DOCUMENT, ensure_ascii=False)
+        fields, parser = feed_chunks([text])
+        self.assertEqual(fields, list(DOCUMENT.items()))
+        self.assertEqual(parser.result(), DOCUMENT)
+
+    def test_chunks_split_mid_string_and_mid_escape(self):
+        text = json.dumps(DOCUMENT, ensure_ascii=False)
+        # 逐字符输入：每个字符串、转义序列（\" 与 \\ 与 \n）都被拆到不同的片段中
+        for size in (1, 2, 3, 7):
+            fields, parser = feed_chunks(split_every(text, size))
+            self.assertEqual(fields, list(DOCUMENT.items()), size)
+            self.assertEqual(parser.text, text)
+
+    def test_escaped_quote_at_chunk_boundary(self):
+        fields, _ = feed_chunks(['{"formTitle": "a\\', '"b", "projectInfo": {}}'])
+        self.assertEqual(fields, [("formTitle", 'a"b'), ("projectInfo", {})])
+
+    def test_field_not_returned_until_complete(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"formTitle": "评审'), [])
+        self.assertEqual(parser.feed('意见表", "projectInfo": {"a": [1, 2'), [("formTitle", "评审意见表")])
+        self.assertEqual(parser.feed("]}}"), [("projectInfo", {"a": [1, 2]})])
+
+    def test_code_fence(self):
+        fields, parser = feed_chunks(["```json\n", '{"formTitle": "t"}', "\n```"])
+        self.assertEqual(fields, [("formTitle", "t")])
+        self.assertEqual(parser.result(), {"formTitle": "t"})
+
+    def test_preamble_with_brackets(self):
+        chunks = ["好的[说明]，以下是]结果】：\n", '{"formTitle": "t", ', '"evaluationSections": [{"id": 1}]}']
+        fields, parser = feed_chunks(chunks)
+        self.assertEqual(fields, [("formTitle", "t"), ("evaluationSections", [{"id": 1}])])
+        self.assertEqual(parser.result(), {"formTitle": "t", "evaluationSections": [{"id": 1}]})
+
+    def test_preamble_with_quotes(self):
+        fields, _ = feed_chunks(['模型说 "好的 {', '"formTitle": "t"}'])
+        self.assertEqual(fields, [("formTitle", "t")])
+
+    def test_text_after_object_ignored(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"formTitle": "t"} 以上'), [("formTitle", "t")])
+        self.assertEqual(parser.feed('{"projectInfo": {}}'), [])
+
+    def test_truncated_output(self):
+        fields, parser = feed_chunks(['{"formTitle": "t", "projectInfo": {"projectTitle": "未完'])
+        self.assertEqual(fields, [("formTitle", "t")])
+        self.assertEqual(parser.result(), {"formTitle": "t", "projectInfo": {"projectTitle": "未完"}})
+
+    def test_trailing_comma_and_unquoted_keys_in_field(self):
+        fields, _ = feed_chunks(['{formTitle: "t", projectInfo: {a: 1, b: [true, null,],},}'])
+        self.assertEqual(fields, [("formTitle", "t"), ("projectInfo", {"a": 1, "b": [True, None]})])
+
+
+class RepairJSONTest(unittest.TestCase):
+
+    def test_valid_json(self):
+        self.assertEqual(repair_json('{"a": 1}'), {"a": 1})
+
+    def test_empty_or_no_object(self):
+        self.assertIsNone(repair_json(""))
+        self.assertIsNone(repair_json(None))
+        self.assertIsNone(repair_json("没有 JSON"))
+
+    def test_code_fence_and_surrounding_text(self):
+        self.assertEqual(repair_json('```json\n{"a": 1}\n```'), {"a": 1})
+        self.assertEqual(repair_json('结果如下[见附件]：{"a": [1]} 以上'), {"a": [1]})
+
+    def test_trailing_commas(self):
+        self.assertEqual(repair_json('{"a": [1, 2, ], "b": {"c": 1, }, }'), {"a": [1, 2], "b": {"c": 1}})
+
+    def test_unquoted_keys(self):
+        self.assertEqual(
+            repair_json('{a: 1, _b: true, $c: null, d: "e: f"}'),
+            {"a": 1, "_b": True, "$c": None, "d": "e: f"},
+        )
+
+    def test_truncated_string(self):
+        self.assertEqual(repair_json('{"a": "未完成的字符'), {"a": "未完成的字符"})
+
+    def test_truncated_inside_escape(self):
+        self.assertEqual(repair_json('{"a": "x\\'), {"a": "x"})
+
+    def test_truncated_after_comma_or_colon(self):
+        self.assertEqual(repair_json('{"a": [1, 2,'), {"a": [1, 2]})
+        self.assertEqual(repair_json('{"a": 1, "b":'), {"a": 1})
+        self.assertEqual(repair_json('{"a": 1, "b"'), {"a": 1})
+        self.assertEqual(repair_json('{"a": 1, "b'), {"a": 1})
+        self.assertEqual(repair_json('{"a": {"b": [1], "c": {'), {"a": {"b": [1], "c": {}}})
+        self.assertEqual(repair_json('{"a": [{"b": 1, "c":'), {"a": [{"b": 1}]})
+        self.assertEqual(repair_json("{"), {})
+
+    def test_raw_newline_in_string(self):
+        self.assertEqual(repair_json('{"a": "第一行\n第二行",}'), {"a": "第一行\n第二行"})
+
+
+class ValidateFieldTest(unittest.TestCase):
+
+    def test_valid_fields(self):
+        for key, value in DOCUMENT.items():
+            self.assertTrue(validate_field(key, value), key)
+
+    def test_unknown_field(self):
+        self.assertFalse(validate_field("extra", "value"))
+
+    def test_wrong_type(self):
+        self.assertFalse(validate_field("formTitle", 1))
+        self.assertFalse(validate_field("projectInfo", []))
+        self.assertFalse(validate_field("evaluationSections", {}))
+        self.assertFalse(validate_field("textualEvaluations", "text"))
+
+    def test_section_without_id(self):
+        self.assertFalse(validate_field("evaluationSections", [{"options": ["优"], "aiRecommendation": "优"}]))
+        self.assertFalse(validate_field("evaluationSections", ["not a dict"]))
+
+    def test_recommendation_not_in_options(self):
+        self.assertFalse(validate_field("evaluationSections", [{"id": 1, "options": ["优", "良"], "aiRecommendation": "差"}]))
+        # 没有选项时不检查推荐值
+        self.assertTrue(validate_field("evaluationSections", [{"id": 1, "aiRecommendation": "差"}]))
+
+    def test_textual_evaluation_without_id(self):
+        self.assertFalse(validate_field("textualEvaluations", [{"content": "x"}]))
+        self.assertFalse(validate_field("textualEvaluations", [None]))
+
+
+if __name__ == "__main__":
+    unittest.main()
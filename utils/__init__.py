@@ -1,6 +1,7 @@
 # utils 模块初始化
-from .get_prompt import get_json_prompt, get_markdown_prompt
-from .conf import get_conf
+from .get_prompt import get_json_prompt, get_markdown_prompt, get_prompts_hash
+from .conf import get_conf, get_conf_hash
+from .registry import registry
 from .log import get_logger
 
-__all__ = ['get_json_prompt', 'get_markdown_prompt', 'get_conf', 'get_logger'] 
\ No newline at end of file
+__all__ = ['get_json_prompt', 'get_markdown_prompt', 'get_prompts_hash', 'get_conf', 'get_conf_hash', 'get_logger', 'registry'] 
\ No newline at end of file
@@ -1,8 +1,10 @@
 import os
+import hashlib
 
 from ruamel.yaml import YAML
 
 from utils.log import get_logger
+from utils.registry import registry
 
 env = os.getenv("ENV", "dev")
 yaml = YAML()
@@ -17,11 +19,75 @@ def read_yaml(yaml_path: str) -> dict:
     return datas
 
 
-def get_conf() -> dict:
+# 基础配置；ENV 不为 dev 时，conf/default.{ENV}.yaml 只需写出与基础配置不同的项，按层级覆盖到基础配置上
+BASE_CONF_PATH = os.path.join(ROOT_DIR, "conf", "default.yaml")
+
+# 最近一次合并的结果：(基础配置哈希, 覆盖配置哈希, 合并后的配置, 合并后的哈希)
+_merged = None
+
+
+def get_conf_path() -> str:
     if env == "dev":
-        conf_path = os.path.join(ROOT_DIR, "conf", "default.yaml")
-    else:
-        conf_path = os.path.join(ROOT_DIR, "conf", f"default.{env}.yaml")
-    conf_data = read_yaml(conf_path)
+        return BASE_CONF_PATH
+    return os.path.join(ROOT_DIR, "conf", f"default.{env}.yaml")
+
+
+def _parse_conf(text: str) -> dict:
+    conf_data = yaml.load(text)
     conf_data["env"] = env
     return conf_data
+
+
+def _parse_overlay(text: str) -> dict:
+    return yaml.load(text) or {}
+
+
+def deep_merge(base: dict, overlay: dict) -> dict:
+    """
+    将 overlay 按层级覆盖到 base 上，返回新的字典（不修改参数）
+
+    两边都是字典的项递归合并，其余（包括列表）以 overlay 为准。
+    """
+    merged = dict(base)
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _load_conf() -> tuple:
+    global _merged
+    base = registry.get(BASE_CONF_PATH, _parse_conf)
+    if env == "dev":
+        return base.content, base.hash
+    overlay = registry.get(get_conf_path(), _parse_overlay)
+    merged = _merged
+    # 两个文件都未变化时返回同一份合并结果
+    if merged is None or merged[0] != base.hash or merged[1] != overlay.hash:
+        content = deep_merge(base.content, overlay.content)
+        content["env"] = env
+        merged_hash = hashlib.sha256(f"{base.hash}:{overlay.hash}".encode("utf-8")).hexdigest()
+        merged = _merged = (base.hash, overlay.hash, content, merged_hash)
+    return merged[2], merged[3]
+
+
+def get_conf() -> dict:
+    """
+    读取配置
+
+    配置只在首次调用和文件修改后解析，其余调用直接返回内存中的同一份配置（调用方不应修改）。
+    模块导入时读取并保存的配置项（例如并发上限）仍需重启后生效。
+    """
+    return _load_conf()[0]
+
+
+def get_conf_hash() -> str:
+    """配置内容的 SHA-256（ENV 不为 dev 时由基础配置和覆盖配置共同决定）"""
+    return _load_conf()[1]
+
+
+def get_workers(conf_data: dict) -> int:
+    """服务的 worker 进程数（server.workers），至少为 1"""
+    return max(1, int(conf_data.get("server", {}).get("workers") or 1))
@@ -1,21 +1,50 @@
 import os
+import hashlib
 
-def get_json_prompt():
-    """读取 JSON 格式化提示词"""
+from utils.conf import ROOT_DIR
+from utils.registry import registry
+from utils.log import get_logger
+
+logger = get_logger("utils.get_prompt")
+
+# 提示词目录，按项目根目录解析，与启动时的工作目录无关
+PROMPT_DIR = os.path.join(ROOT_DIR, "doc", "prompt")
+JSON_PROMPT = "Json_prompt.md"
+MARKDOWN_PROMPT = "markdown_prompt.md"
+
+
+def get_prompt_entry(name):
+    """
+    读取提示词文件（内存缓存，文件修改后自动重新加载）
+
+    Args:
+        name: doc/prompt 下的文件名
+
+    Returns:
+        FileEntry: 提示词内容及内容哈希，读取失败时返回 None
+    """
     try:
-        prompt_path = os.path.join("doc", "prompt", "Json_prompt.md")
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
+        return registry.get(os.path.join(PROMPT_DIR, name))
     except Exception as e:
-        print(f"[ERROR] 读取 JSON 提示词失败: {str(e)}")
-        return ""  # 如果读取失败，返回空字符串，不影响原有功能
+        logger.error("读取提示词 %s 失败: %s", name, e)
+        return None
+
+
+def get_json_prompt():
+    """读取 JSON 格式化提示词"""
+    entry = get_prompt_entry(JSON_PROMPT)
+    return entry.content if entry else ""  # 如果读取失败，返回空字符串，不影响原有功能
 
 def get_markdown_prompt():
     """读取 Markdown 格式化提示词"""
-    try:
-        prompt_path = os.path.join("doc", "prompt", "markdown_prompt.md")
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception as e:
-        print(f"[ERROR] 读取 Markdown 提示词失败: {str(e)}")
-        return ""  # 如果读取失败，返回空字符串，不影响原有功能 
\ No newline at end of file
+    entry = get_prompt_entry(MARKDOWN_PROMPT)
+    return entry.content if entry else ""  # 如果读取失败，返回空字符串，不影响原有功能
+
+def get_prompts_hash():
+    """全部提示词文件内容的组合哈希，任一提示词修改后随之变化"""
+    digest = hashlib.sha256()
+    for name in (MARKDOWN_PROMPT, JSON_PROMPT):
+        entry = get_prompt_entry(name)
+        digest.update((entry.hash if entry else "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -1,41 +1,171 @@
+import json
 import time
+import queue
+import atexit
 import pathlib
 import logging
+import contextvars
+import logging.handlers
 
+# 项目根目录路径（与 utils.conf.ROOT_DIR 相同，conf 依赖本模块，因此在这里单独计算）
+ROOT_DIR = pathlib.Path(__file__).resolve().parent.parent
 
-def get_logger(name: str = "project", level: str = "info", save_file: bool = False) -> logging.Logger:
-    # set logger
-    logger = logging.getLogger(name)
-    level_dict = {
-        "debug": logging.DEBUG,
-        "info": logging.INFO,
-        "warning": logging.WARNING,
-        "error": logging.ERROR,
-        "critical": logging.CRITICAL
-    }
-    logger.setLevel(level_dict[level])
-
-    if not logger.handlers:
-        sh = logging.StreamHandler()
-        sh.setLevel(logging.DEBUG)
-        stream_fmt = logging.Formatter("%(asctime)-15s [%(filename)s] %(levelname)s %(lineno)d: %(message)s")
-        sh.setFormatter(stream_fmt)
-        logger.addHandler(sh)
-
-        if save_file:
-            log_path = log_path_utils(name)
-            fh = logging.FileHandler(log_path)
-            fh.setLevel(logging.INFO)
-            fh_fmt = logging.Formatter("%(asctime)-15s [%(filename)s] %(levelname)s %(lineno)d: %(message)s")
-            fh.setFormatter(fh_fmt)
-            logger.addHandler(fh)
+# 关联 ID：由请求入口和评审任务设置，随 asyncio 任务上下文自动传递，写入每条日志
+request_id_var = contextvars.ContextVar("request_id", default="-")
+job_id_var = contextvars.ContextVar("job_id", default="-")
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "critical": logging.CRITICAL
+}
+
+TEXT_FORMAT = "%(asctime)-15s [%(name)s] %(levelname)s %(lineno)d [req=%(request_id)s job=%(job_id)s]: %(message)s"
+
+# 全局日志设置，由 configure_logging 根据配置更新
+_settings = {"level": "info", "save_file": False, "format": "text"}
+# 通过 get_logger 创建的日志器及其显式指定的参数
+_loggers = {}
+# 所有日志先写入内存队列，由后台线程统一输出，调用方（事件循环）不等待 I/O
+_queue = queue.SimpleQueue()
+_listener = None
+_stream_handler = None
+_file_handlers = {}
+
+
+class ContextFilter(logging.Filter):
+    """在产生日志的线程/任务中读取关联 ID，写入日志记录"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，便于日志系统检索"""
+
+    def format(self, record):
+        data = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "request_id": getattr(record, "request_id", "-"),
+            "job_id": getattr(record, "job_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    只在调用方完成消息插值，异常堆栈等格式化工作留给后台线程
+
+    标准 QueueHandler 会在调用方线程中完整格式化记录（包括异常堆栈）。
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _formatter():
+    if _settings["format"] == "json":
+        return JSONFormatter()
+    return logging.Formatter(TEXT_FORMAT)
 
+
+def _ensure_listener():
+    global _listener, _stream_handler
+    if _listener is not None:
+        return
+    _stream_handler = logging.StreamHandler()
+    _stream_handler.setFormatter(_formatter())
+    _listener = logging.handlers.QueueListener(_queue, _stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        # 输出队列中剩余的日志后再退出
+        _listener.stop()
+        _listener = None
+
+
+def _add_file_handler(name):
+    if name in _file_handlers:
+        return
+    handler = logging.FileHandler(log_path_utils(name), encoding="utf-8")
+    handler.setFormatter(_formatter())
+    # 只写入该日志器（及其子日志器）的记录
+    handler.addFilter(logging.Filter(name))
+    _file_handlers[name] = handler
+    _listener.handlers = (*_listener.handlers, handler)
+
+
+def _apply(name):
+    logger, level, save_file = _loggers[name]
+    logger.setLevel(LEVELS[level or _settings["level"]])
+    if save_file if save_file is not None else _settings["save_file"]:
+        _add_file_handler(name)
+
+
+def get_logger(name: str = "project", level: str = None, save_file: bool = None) -> logging.Logger:
+    """
+    获取日志器
+
+    日志经内存队列由后台线程写出，不阻塞事件循环；每条日志附带当前的请求 ID 和评审任务 ID。
+    低于当前级别的日志在调用处直接跳过，使用 logger.debug("... %s", value) 的惰性格式化写法时
+    不会产生任何字符串格式化开销。
+
+    Args:
+        name: 日志器名称，通常为模块名
+        level: 日志级别，为空时使用 configure_logging 设置的全局级别
+        save_file: 是否同时写入 log/<日期>/<name>.log，为空时使用全局设置
+
+    Returns:
+        logging.Logger: 日志器
+    """
+    _ensure_listener()
+    logger = logging.getLogger(name)
+    if name not in _loggers:
+        handler = _QueueHandler(_queue)
+        handler.addFilter(ContextFilter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    _loggers[name] = (logger, level, save_file)
+    _apply(name)
     return logger
 
 
+def configure_logging(level: str = "info", save_file: bool = False, fmt: str = "text") -> None:
+    """
+    更新全局日志设置，对已创建和之后创建的日志器都生效
+
+    Args:
+        level: 日志级别（debug / info / warning / error / critical）
+        save_file: 是否写入日志文件
+        fmt: 输出格式，text 或 json
+    """
+    _settings.update(level=level, save_file=save_file, format=fmt)
+    _ensure_listener()
+    for handler in (_stream_handler, *_file_handlers.values()):
+        handler.setFormatter(_formatter())
+    for name in list(_loggers):
+        _apply(name)
+
+
 def log_path_utils(name: str) -> str:
     day = time.strftime("%Y-%m-%d", time.localtime())
-    log_path = pathlib.Path(f"./log/{day}")
+    log_path = ROOT_DIR / "log" / day
     if not log_path.exists():
         log_path.mkdir(parents=True)
     return f"{str(log_path)}/{name}.log"
@@ -0,0 +1,85 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Callable, NamedTuple, Optional
+
+from utils.log import get_logger
+
+logger = get_logger("utils.registry")
+
+
+class FileEntry(NamedTuple):
+    # 加载后的内容（文本或解析后的对象）
+    content: Any
+    # 文件内容的 SHA-256，可直接作为缓存键的一部分
+    hash: str
+    # (修改时间, 文件大小)，用于判断文件是否变化
+    stat_key: tuple
+
+
+class FileRegistry:
+    """
+    文件内容注册表
+
+    文件首次读取后缓存在内存中，并记录内容哈希。每个文件最多每隔 check_interval 秒
+    检查一次修改时间和大小，变化时重新读取并整体替换缓存记录，读取方要么拿到旧内容、
+    要么拿到新内容，不会看到两者混合。重新加载失败时继续使用上一次成功加载的内容。
+    """
+
+    def __init__(self, check_interval: float = 2.0):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, loader: Optional[Callable[[str], Any]] = None) -> FileEntry:
+        """
+        读取文件内容
+
+        Args:
+            path: 文件绝对路径
+            loader: 将文件文本转换为内容的函数，为空时内容即文本
+
+        Returns:
+            FileEntry: 文件内容及哈希
+
+        Raises:
+            OSError: 文件从未成功加载且无法读取
+        """
+        entry = self._entries.get(path)
+        if entry is not None and time.monotonic() - self._checked_at.get(path, 0) < self.check_interval:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and time.monotonic() - self._checked_at.get(path, 0) < self.check_interval:
+                return entry
+            try:
+                entry = self._load(path, entry, loader)
+            except Exception as e:
+                if entry is None:
+                    raise
+                logger.error("重新加载 %s 失败，继续使用已加载的内容: %s", path, e)
+            self._checked_at[path] = time.monotonic()
+            return entry
+
+    def _load(self, path, entry, loader):
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        if entry is not None and entry.stat_key == stat_key:
+            return entry
+
+        with open(path, "rb") as f:
+            data = f.read()
+        text = data.decode("utf-8")
+        content = loader(text) if loader else text
+        new_entry = FileEntry(content, hashlib.sha256(data).hexdigest(), stat_key)
+        if entry is not None:
+            logger.info("检测到 %s 已修改，重新加载", path)
+        self._entries[path] = new_entry
+        return new_entry
+
+
+# 全局注册表，提示词和配置文件共用
+registry = FileRegistry(check_interval=float(os.getenv("RELOAD_INTERVAL", "2")))